@@ -1,16 +1,47 @@
-import json
+from typing import Any
+from typing import Union
 
 from flasgger import Swagger
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 
 from cloudimagedirectory.api.routes.aws import aws_blueprint
 from cloudimagedirectory.api.routes.azure import azure_blueprint
 from cloudimagedirectory.api.routes.google import google_blueprint
 from cloudimagedirectory.api.routes.health import health_blueprint
+from cloudimagedirectory.serialize import serialize
 from cloudimagedirectory.update_images import schema
 
 
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes through the fast JSON backend.
+
+    Responses are byte-identical to the default provider of Flask, arguments
+    the serialization layer doesn't support are passed to the default one.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        kwargs.setdefault("default", self.default)
+        kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        if kwargs["ensure_ascii"] is not True or not kwargs.keys() <= {
+            "default",
+            "ensure_ascii",
+            "sort_keys",
+            "indent",
+            "separators",
+        }:
+            return super().dumps(obj, **kwargs)
+        del kwargs["ensure_ascii"]
+        return serialize.dumps(obj, **kwargs)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return serialize.loads(s)
+
+
 def create_app(file_path: str) -> Flask:
     """Creates and returns a Flask server configuration including cloud image
     data.
@@ -21,6 +52,7 @@ def create_app(file_path: str) -> Flask:
     Returns: A FLask instance
     """
     app = Flask(__name__)
+    app.json = JSONProvider(app)
 
     app.config["SWAGGER"] = {
         "title": "Cloud Image Locator",
@@ -32,8 +64,8 @@ def create_app(file_path: str) -> Flask:
     # Add support for .env parsing:
     app.config.from_pyfile("config.py")
 
-    with open(file_path) as f:
-        image_data = json.load(f)
+    with open(file_path, "rb") as f:
+        image_data = serialize.loads(f.read())
     schema.validate_json(image_data)
 
     app.register_blueprint(
@@ -1,7 +1,6 @@
 """CLI for updating images and other routine tasks."""
 from __future__ import annotations
 
-import json
 import logging
 import sys
 
@@ -11,6 +10,7 @@ import waitress
 
 from cloudimagedirectory import __version__
 from cloudimagedirectory.api import server
+from cloudimagedirectory.serialize import serialize
 from cloudimagedirectory.update_images import aws
 from cloudimagedirectory.update_images import azure
 from cloudimagedirectory.update_images import google
@@ -86,7 +86,7 @@ def aws_regions() -> None:
     """Get all valid AWS regions."""
     try:
         regions = aws.get_regions()
-        click.echo(json.dumps(regions, indent=2))
+        click.echo(serialize.dumps(regions, indent=2))
     except Exception as err:
         logger.exception(err)
         raise err
@@ -117,7 +117,7 @@ def azure_images() -> None:
 def dump_images(images: object) -> None:
     """Validate and dump image data in JSON format."""
     schema.validate_json(images)
-    click.echo(json.dumps(images, indent=2))
+    click.echo(serialize.dumps(images, indent=2))
 
 
 @click.command()
@@ -1,6 +1,7 @@
 """Configuration for the locator."""
 from __future__ import annotations
 
+import itertools
 import os
 
 
@@ -19,6 +20,27 @@ AWS_CLOUD_ACCESS_BILLING_CODE = "RunInstances:0000"
 # RHEL's OwnerId for RHEL images in AWS is 309956199498.
 AWS_RHEL_OWNER_ID = "309956199498"
 
+# Server side filters for the RHEL images. EC2 can't filter by UsageOperation,
+# the billing code is checked after the images are retrieved. Name filters are
+# case sensitive, while image names are parsed ignoring the case, so every
+# case variant of the RHEL prefix is listed.
+AWS_IMAGE_FILTERS = [
+    {
+        "Name": "name",
+        "Values": ["".join(x) + "*" for x in itertools.product(*zip("RHEL", "rhel"))],
+    }
+]
+
+# Sets the number of images that are retrieved per request
+AWS_PAGE_SIZE = 1000
+
+# Sets the number of regions that are queried concurrently
+AWS_MAX_WORKERS = int(os.environ.get("AWS_MAX_WORKERS", 16))
+
+# Sets the number of attempts of an api call, throttled calls are retried with
+# the adaptive retry mode of botocore
+AWS_MAX_ATTEMPTS = 10
+
 #     ___
 #    /   |____  __  __________
 #   / /| /_  / / / / / ___/ _ \
@@ -31,9 +53,20 @@ AZURE_CLIENT_SECRET = os.environ.get("AZURE_CLIENT_SECRET", None)
 AZURE_TENANT_ID = os.environ.get("AZURE_TENANT_ID", None)
 AZURE_SUBSCRIPTION_ID = os.environ.get("AZURE_SUBSCRIPTION_ID", None)
 
+# Access tokens are refreshed this many seconds before they expire.
+AZURE_TOKEN_REFRESH_MARGIN = 300
+
+# Set a file to keep the access token between runs, it isn't kept by default.
+AZURE_TOKEN_CACHE = os.environ.get("AZURE_TOKEN_CACHE", None)
+
 # Set a default location unless otherwise specified.
 AZURE_DEFAULT_LOCATION = "eastus"
 
+# Base url of the Azure management api
+AZURE_MANAGEMENT_URL = os.environ.get(
+    "AZURE_MANAGEMENT_URL", "https://management.azure.com"
+)
+
 # Finding images in Azure requires traversing a tree:
 #     publisher > offer > sku > image_versions
 # The dict below sets which publishers, offers, and skus we should examine for
@@ -89,9 +122,25 @@ AZURE_RHEL_IMAGE_TREE = [
 # Sets the number of api call retries
 AZURE_MAX_RETRIES = 5
 
-# Sets the time before a timeout
+# Sets the time before a timeout, the time doubles with every retry
 AZURE_REQUEST_FAILURE_TIMEOUT = 1
 
+# Sets the longest time before a retry, also for Retry-After headers
+AZURE_MAX_BACKOFF = 30
+
+# Sets the number of retries of all api calls in a run
+AZURE_RETRY_BUDGET = 50
+
+# Set a directory to keep the publisher, offer, sku and image version listings
+# between runs. Cached listings are revalidated with conditional requests, or
+# used without a request while they are younger than AZURE_HTTP_CACHE_TTL
+# seconds.
+AZURE_HTTP_CACHE = os.environ.get("AZURE_HTTP_CACHE", None)
+AZURE_HTTP_CACHE_TTL = int(os.environ.get("AZURE_HTTP_CACHE_TTL", 0))
+
+# Sets the number of api calls that are made concurrently
+AZURE_MAX_WORKERS = int(os.environ.get("AZURE_MAX_WORKERS", 8))
+
 #    ________________
 #   / ____/ ____/ __ \
 #  / / __/ /   / /_/ /
@@ -1,8 +1,18 @@
+import hashlib
 import json
 import os
 import pathlib
+import re
+import threading
 
 from pathlib import Path
+from typing import IO
+from typing import Any
+from typing import Iterator
+from typing import Optional
+
+from cloudimagedirectory.format import format_date
+from cloudimagedirectory.serialize import serialize
 
 
 exception_not_connected = Exception("Client is not connected to s3 bucket")
@@ -12,6 +22,88 @@ exception_path_not_existing = Exception(
 )
 exception_not_implemented = Exception("Not implemented")
 
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+
+def stream_json_array(file: IO[str], chunk_size: int = 1 << 16) -> Iterator:
+    """Yield the items of a top level JSON array one by one.
+
+    Only the item that is currently decoded and one chunk of the file are
+    kept in memory. An empty file yields nothing and a top level object is
+    decoded at once and iterated like a dict.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size)
+    eof = buffer == ""
+    pos = WHITESPACE.match(buffer).end()
+    if pos == len(buffer) and eof:
+        return
+    if buffer[pos : pos + 1] != "[":
+        yield from json.loads(buffer + file.read())
+        return
+    pos += 1
+
+    expect_item = True
+    allow_end = True
+    while True:
+        pos = WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer) and not eof:
+            # NOTE: Drop the consumed part of the buffer before reading more.
+            chunk = file.read(chunk_size)
+            eof = chunk == ""
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        if buffer[pos : pos + 1] == "]" and allow_end:
+            # NOTE: Only whitespace may follow the array, like json.loads.
+            pos = WHITESPACE.match(buffer, pos + 1).end()
+            while pos == len(buffer) and not eof:
+                buffer = file.read(chunk_size)
+                eof = buffer == ""
+                pos = WHITESPACE.match(buffer).end()
+            if pos != len(buffer):
+                raise json.JSONDecodeError("Extra data", buffer, pos)
+            return
+        if not expect_item:
+            if buffer[pos : pos + 1] != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            pos += 1
+            expect_item = True
+            allow_end = False
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            if isinstance(item, (int, float)) and not isinstance(item, bool):
+                tail = NUMBER_TAIL.match(buffer, end).end()
+                if tail != end and (tail != len(buffer) or eof):
+                    raise json.JSONDecodeError("Invalid number", buffer, end)
+                end = tail
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            end = len(buffer)
+        if end == len(buffer) and not eof:
+            # NOTE: The item might continue in the next chunk, numbers are
+            # only complete if they are followed by a delimiter.
+            chunk = file.read(chunk_size)
+            eof = chunk == ""
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        yield item
+        pos = end
+        expect_item = False
+        allow_end = True
+
+
+def encode_page(content: Any) -> bytes:
+    """Serialize the content of a written file, JSON and a trailing newline."""
+    return (serialize.dumps(content) + "\n").encode()
+
 
 class Connection:
     def connect(self):
@@ -23,20 +115,140 @@ class Connection:
     def get_content(self, filename):
         pass
 
-    def put_content(self, content, filename):
+    def put_content(self, data):
+        pass
+
+    def get_stat(self, data):
+        pass
+
+    def get_hash(self, data):
         pass
 
 
+NOT_LOADED = object()
+PROVIDERS = ("aws", "azure", "google")
+
+KIND_RAW = "raw"
+KIND_IDX = "idx"
+KIND_IMAGE = "image"
+
+
 class DataEntry:
-    filename = ""
-    content = None
+    """A file and its parsed JSON content.
+
+    The content is either given or loaded on first access by the loader,
+    which is called with the entry and returns the content. Evicted content
+    is loaded again on the next access, entries without a loader have no
+    content after they are evicted.
 
-    def __init__(self, filename, content):
+    The kind (raw, idx or image), provider, region and image slug are parsed
+    from the filename whenever it is set:
+
+        raw:   .../raw/aws/eu-west-1.json -> provider aws, region eu-west-1
+        image: aws/eu-west-1/rhel_9       -> provider aws, region eu-west-1
+        idx:   idx/list/image-names
+
+    The provider of a raw file is the directory below the raw directory, the
+    provider of an image is the first directory of its path.
+    """
+
+    __slots__ = (
+        "_filename",
+        "_content",
+        "loader",
+        "kind",
+        "provider",
+        "region",
+        "slug",
+        "_date",
+        "_filename_lower",
+    )
+
+    def __init__(self, filename, content=None, loader=None):
         self.filename = filename
-        self.content = content
+        self._content = NOT_LOADED if content is None else content
+        self.loader = loader
+        self._date = None
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @filename.setter
+    def filename(self, filename):
+        self._filename = filename
+        self._filename_lower = None
+        self.provider = None
+        self.region = None
+        self.slug = None
+        parts = filename.split("/")
+        directories = parts[:-1]
+
+        if "raw" in directories:
+            self.kind = KIND_RAW
+            raw = len(directories) - 1 - directories[::-1].index("raw")
+            if raw + 1 < len(directories) and directories[raw + 1] in PROVIDERS:
+                self.provider = directories[raw + 1]
+            self.region = os.path.basename(filename).split(".")[0]
+        elif "idx" in directories:
+            self.kind = KIND_IDX
+        else:
+            self.kind = KIND_IMAGE
+            if parts[0] in PROVIDERS:
+                self.provider = parts[0]
+            if len(parts) == 3:
+                self.region = parts[1]
+            self.slug = parts[-1]
+
+    @property
+    def content(self):
+        if self._content is NOT_LOADED:
+            if self.loader is None:
+                return None
+            self._content = self.loader(self)
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+
+    @property
+    def filename_lower(self):
+        """The lowercased filename, computed once."""
+        if self._filename_lower is None:
+            self._filename_lower = self._filename.lower()
+        return self._filename_lower
+
+    @property
+    def date(self):
+        """Sortable key of the image date, see format_date.date_key.
+
+        The transformers set the key when they format an image, otherwise it
+        is computed from the content on first access.
+        """
+        if self._date is None:
+            content = self.content
+            if isinstance(content, dict) and "date" in content:
+                self._date = format_date.date_key(content["date"])
+        return self._date
+
+    @date.setter
+    def date(self, date):
+        self._date = date
+
+    def __reduce__(self):
+        content = self._content if self.is_loaded() else None
+        return DataEntry, (self.filename, content, self.loader)
+
+    def is_loaded(self) -> bool:
+        return self._content is not NOT_LOADED
+
+    def evict(self):
+        """Drop the content, it is loaded again by the loader if needed."""
+        self._content = NOT_LOADED
 
     def is_raw(self) -> bool:
-        return self.filename.__contains__("raw/")
+        return self.kind == KIND_RAW
 
     def is_provided_by(self, input: str) -> bool:
         return self.filename.__contains__(input + "/")
@@ -45,10 +257,21 @@ class DataEntry:
 class ConnectionFS(Connection):
     origin_path: str = ""
     arg_files: list[str] = []
+    skip_unchanged: bool = False
+    stream: bool = False
 
-    def __init__(self, origin_path: str, arg_files: list[str]):
+    def __init__(
+        self,
+        origin_path: str,
+        arg_files: list[str],
+        skip_unchanged: bool = False,
+        stream: bool = False,
+    ):
         self.arg_files = arg_files
         self.origin_path = origin_path
+        self.skip_unchanged = skip_unchanged
+        self.stream = stream
+        self.__dirs: set[str] = set()
         if self.origin_path == "":
             self.origin_path = os.getcwd()
 
@@ -59,7 +282,7 @@ class ConnectionFS(Connection):
         if len(self.arg_files) != 0:
             result = []
             for file in self.arg_files:
-                result.append(DataEntry(file, None))
+                result.append(DataEntry(file, loader=self.load_content))
             return result
         return self.__list_files(self.origin_path)
 
@@ -68,23 +291,289 @@ class ConnectionFS(Connection):
         p = pathlib.Path(dir)
         if p.exists():
             for child in p.glob("**/*.json"):
-                data_files.append(DataEntry(str(child.resolve()), None))
+                data_files.append(
+                    DataEntry(str(child.resolve()), loader=self.load_content)
+                )
         else:
             raise exception_path_not_existing
         return data_files
 
     def get_content(self, data) -> DataEntry:
-        content: str = ""
-        content = Path(data.filename).read_text()
-        if content == "":
-            content = "{}"
-        content = json.loads(content)
-        return DataEntry(data.filename, content)
+        """Read and parse the JSON content of the file.
 
-    def put_content(self, data):
-        json_data = json.dumps(data.content)
-        tmp = data.filename.split("/")
-        tmp = tmp[: len(tmp) - 1]
-        tmp = "/".join(tmp)
-        os.makedirs(tmp, exist_ok=True)
-        Path(data.filename).write_text(json_data + "\n")
+        If stream is set, the content is an iterator that parses the items of
+        the top level array one by one while it is consumed.
+        """
+        if self.stream:
+            return DataEntry(data.filename, self.__stream_content(data.filename))
+
+        content: bytes = b""
+        content = Path(data.filename).read_bytes()
+        if content == b"":
+            content = b"{}"
+        return DataEntry(data.filename, serialize.loads(content))
+
+    def load_content(self, data):
+        """Load the content of a listed entry."""
+        return self.get_content(data).content
+
+    def __stream_content(self, filename: str) -> Iterator:
+        with open(filename) as f:
+            yield from stream_json_array(f)
+
+    def get_stat(self, data) -> tuple[int, int]:
+        """Return the size and the modification time in ns of the file."""
+        stat = os.stat(data.filename)
+        return stat.st_size, stat.st_mtime_ns
+
+    def get_hash(self, data) -> str:
+        """Return the sha256 hash of the file content."""
+        digest = hashlib.sha256()
+        with open(data.filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def put_content(self, data) -> bool:
+        """Write the content as JSON to the file.
+
+        The content is written to a temporary file first, which then replaces
+        the destination, so readers never see a partially written file. If
+        skip_unchanged is set, files that already contain the same JSON are
+        left untouched, which keeps their modification time.
+
+        Returns:
+            True if the file was written, False if it was skipped.
+        """
+        payload = encode_page(data.content)
+        if self.skip_unchanged and self.__is_unchanged(data.filename, payload):
+            return False
+
+        directory = os.path.dirname(data.filename)
+        if directory != "" and directory not in self.__dirs:
+            os.makedirs(directory, exist_ok=True)
+            self.__dirs.add(directory)
+
+        tmp = f"{data.filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            Path(tmp).write_bytes(payload)
+            os.replace(tmp, data.filename)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return True
+
+    def __is_unchanged(self, filename: str, payload: bytes) -> bool:
+        try:
+            if os.path.getsize(filename) != len(payload):
+                return False
+            return Path(filename).read_bytes() == payload
+        except OSError:
+            return False
+
+
+class ConnectionS3(Connection):
+    """Reads and writes JSON files in an S3 bucket.
+
+    Filenames are URLs in the form s3://bucket/key, so they can be prefixed
+    with a destination path like the paths of ConnectionFS. The client keeps
+    a pool of connections that is large enough for all workers, botocore
+    clients are thread safe and are shared by the loaders and writers.
+    """
+
+    page_size: int = 1000
+
+    def __init__(
+        self,
+        origin_path: str,
+        arg_files: list[str],
+        skip_unchanged: bool = False,
+        workers: int = 1,
+        endpoint_url: Optional[str] = None,
+    ):
+        self.origin_path = origin_path.rstrip("/")
+        self.arg_files = arg_files
+        self.skip_unchanged = skip_unchanged
+        self.workers = workers
+        self.endpoint_url = endpoint_url
+        self.client: Any = None
+        self.bucket, self.prefix = split_s3_url(self.origin_path)
+        # NOTE: Size, modification time and ETag of every listed object.
+        self.__objects: dict[str, tuple[int, int, str]] = {}
+        self.__listed = False
+        self.__lock = threading.Lock()
+        self.__list_lock = threading.Lock()
+
+    def connect(self, client=None):
+        """Create the S3 client, or use the given one."""
+        if self.client is not None:
+            raise exception_already_connected
+        if client is None:
+            # NOTE: boto3 is slow to import, filesystem runs don't need it.
+            import boto3
+            import botocore.config
+
+            client = boto3.client(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                config=botocore.config.Config(
+                    max_pool_connections=max(10, self.workers * 2),
+                    retries={"mode": "standard"},
+                ),
+            )
+        self.client = client
+
+    def get_filenames(self) -> list[DataEntry]:
+        if self.client is None:
+            raise exception_not_connected
+        if len(self.arg_files) != 0:
+            return [
+                DataEntry(file, loader=self.load_content) for file in self.arg_files
+            ]
+        return [
+            DataEntry(self.__url(key), loader=self.load_content)
+            for key in self.__list_objects()
+            if key.endswith(".json")
+        ]
+
+    def __list_objects(self) -> list[str]:
+        prefix = self.prefix + "/" if self.prefix != "" else ""
+        paginator = self.client.get_paginator("list_objects_v2")
+        keys = []
+        objects = {}
+        for page in paginator.paginate(
+            Bucket=self.bucket,
+            Prefix=prefix,
+            PaginationConfig={"PageSize": self.page_size},
+        ):
+            for item in page.get("Contents", []):
+                keys.append(item["Key"])
+                objects[item["Key"]] = (
+                    item["Size"],
+                    int(item["LastModified"].timestamp() * 1_000_000_000),
+                    item["ETag"],
+                )
+        with self.__lock:
+            self.__objects.update(objects)
+            self.__listed = True
+        return keys
+
+    def __url(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+    def get_content(self, data) -> DataEntry:
+        """Download and parse the JSON content of the object."""
+        if self.client is None:
+            raise exception_not_connected
+        bucket, key = split_s3_url(data.filename)
+        content = self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        if content == b"":
+            content = b"{}"
+        return DataEntry(data.filename, serialize.loads(content))
+
+    def load_content(self, data):
+        """Load the content of a listed entry."""
+        return self.get_content(data).content
+
+    def __getstate__(self):
+        # NOTE: The client and the lock can't be sent to worker processes,
+        # the workers connect on their own.
+        state = self.__dict__.copy()
+        state["client"] = None
+        state["connected"] = self.client is not None
+        del state["_ConnectionS3__lock"]
+        del state["_ConnectionS3__list_lock"]
+        return state
+
+    def __setstate__(self, state):
+        connected = state.pop("connected", True)
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+        self.__list_lock = threading.Lock()
+        if connected:
+            self.connect()
+
+    def get_stat(self, data) -> tuple[int, int]:
+        """Return the size and the modification time in ns of the object."""
+        size, mtime, _ = self.__head(data.filename)
+        return size, mtime
+
+    def get_hash(self, data) -> str:
+        """Return the ETag of the object."""
+        return self.__head(data.filename)[2]
+
+    def __head(self, filename: str) -> tuple[int, int, str]:
+        if self.client is None:
+            raise exception_not_connected
+        bucket, key = split_s3_url(filename)
+        with self.__lock:
+            stat = self.__objects.get(key) if bucket == self.bucket else None
+        if stat is not None:
+            return stat
+
+        head = self.client.head_object(Bucket=bucket, Key=key)
+        return (
+            head["ContentLength"],
+            int(head["LastModified"].timestamp() * 1_000_000_000),
+            head["ETag"],
+        )
+
+    def put_content(self, data) -> bool:
+        """Upload the content as JSON to the object.
+
+        If skip_unchanged is set, the objects below the path of the
+        connection are listed once, and objects whose listed ETag matches the
+        MD5 hash of the new content are not uploaded again. This is a local
+        skip-if-same-ETag check, the upload itself is not conditional.
+
+        Returns:
+            True if the object was written, False if it was skipped.
+        """
+        if self.client is None:
+            raise exception_not_connected
+        bucket, key = split_s3_url(data.filename)
+        payload = encode_page(data.content)
+        etag = '"' + hashlib.md5(payload).hexdigest() + '"'  # nosec B324
+        if self.skip_unchanged and bucket == self.bucket:
+            # NOTE: The first writers wait for a single listing of the path.
+            with self.__list_lock:
+                if not self.__listed:
+                    self.__list_objects()
+            with self.__lock:
+                stat = self.__objects.get(key)
+            if stat is not None and stat[2] == etag:
+                return False
+
+        response = self.client.put_object(
+            Bucket=bucket, Key=key, Body=payload, ContentType="application/json"
+        )
+        with self.__lock:
+            self.__objects.pop(key, None)
+            if bucket == self.bucket and response.get("ETag") == etag:
+                self.__objects[key] = (len(payload), 0, etag)
+        return True
+
+
+def split_s3_url(url: str) -> tuple[str, str]:
+    """Split an URL in the form s3://bucket/key into bucket and key."""
+    if not url.startswith("s3://"):
+        raise ValueError(f"not an S3 URL: {url}")
+    bucket, _, key = url[len("s3://") :].partition("/")
+    return bucket, key
+
+
+def open_connection(
+    path: str,
+    arg_files: list[str],
+    skip_unchanged: bool = False,
+    stream: bool = False,
+    workers: int = 1,
+) -> Connection:
+    """Open a connection to an S3 URL or to a filesystem path."""
+    if path.startswith("s3://"):
+        conn: Connection = ConnectionS3(path, arg_files, skip_unchanged, workers)
+    else:
+        conn = ConnectionFS(path, arg_files, skip_unchanged, stream)
+    conn.connect()
+    return conn
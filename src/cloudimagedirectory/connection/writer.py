@@ -0,0 +1,61 @@
+"""Writes data entries in batches through a connection."""
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BatchWriter:
+    """Collects data entries and writes them in batches.
+
+    Entries are buffered until the batch is full and then written through
+    the put_content method of the connection, on a thread pool if more than
+    one worker is configured. Within a batch only the last entry of every
+    filename is written, batches are written one after another, so the
+    last entry put for a filename always ends up in the file.
+    """
+
+    def __init__(self, conn, workers: int = 1, batch_size: int = 500):
+        """Initialize the writer."""
+        self.conn = conn
+        self.workers = workers
+        self.batch_size = batch_size
+        self.written = 0
+        self.skipped = 0
+        self.pending: dict = {}
+        self.executor = None
+        if self.workers > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.pending = {}
+        self.close()
+
+    def put(self, data):
+        """Add an entry to the current batch."""
+        self.pending[data.filename] = data
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write all pending entries."""
+        batch = list(self.pending.values())
+        self.pending = {}
+        if self.executor is None:
+            written = map(self.conn.put_content, batch)
+        else:
+            written = self.executor.map(self.conn.put_content, batch)
+
+        for result in written:
+            if result is False:
+                self.skipped += 1
+            else:
+                self.written += 1
+
+    def close(self):
+        """Write all pending entries and stop the workers."""
+        self.flush()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
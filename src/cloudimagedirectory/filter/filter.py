@@ -1,25 +1,69 @@
+import re
+
+from datetime import datetime
 from typing import Callable
+from typing import Union
+
+from cloudimagedirectory.format import format_date
+
+
+class Filter:
+    """Keeps the entries that match a predicate.
+
+    A filter is called with a list of entries and returns the matching ones.
+    The pipeline evaluates the match methods of all its filters in a single
+    pass over the entries instead.
+    """
+
+    def __init__(self, name: str, predicate: Callable):
+        """Initialize the filter."""
+        self.name = name
+        self.predicate = predicate
+
+    def match(self, entry) -> bool:
+        """Check whether the entry is kept."""
+        return self.predicate(entry)
 
-import pandas as pd
-import pytz  # type: ignore
+    def __call__(self, data):
+        return [d for d in data if self.predicate(d)]
 
 
-def FilterImageByFilename(word: str) -> Callable:
+def FilterImageByFilename(word: str) -> Filter:
     """Filter images by filename."""
     print("filter images by filename: " + word)
-    return lambda data: [
-        d for d in data if not d.filename.lower().__contains__(word.lower())
-    ]
+    word = word.lower()
+    return Filter(f"filename {word}", lambda d: not d.filename_lower.__contains__(word))
 
 
-def FilterImageByLatestUpdate(latestDate: pd.Timestamp) -> Callable:
-    """Filter images by latest date."""
+def FilterImageByFilenames(words: list[str]) -> Filter:
+    """Filter images by any of the words in their filename.
+
+    All words are compiled into one regular expression, so every filename
+    is scanned once regardless of the number of words.
+    """
+    words = sorted({x.lower() for x in words if x != ""}, key=lambda w: (-len(w), w))
+    print("filter images by filenames: " + ",".join(words))
+    if len(words) == 0:
+        return Filter("filenames", lambda d: True)
+
+    pattern = re.compile("|".join(re.escape(x) for x in words))
+    return Filter(
+        "filenames " + ",".join(words),
+        lambda d: pattern.search(d.filename_lower) is None,
+    )
+
+
+def FilterImageByLatestUpdate(latestDate: Union[str, datetime]) -> Filter:
+    """Filter images by latest date.
+
+    The date is either a datetime, such as a pandas Timestamp, or a date
+    string that format_date.date_key can parse.
+    """
     print(f"filter images by latest date: {latestDate}")
-    latestDate = latestDate.replace(tzinfo=pytz.UTC)
-
-    return lambda data: [
-        d
-        for d in data
-        if d.content is not None
-        and pd.Timestamp(d.content["date"]).replace(tzinfo=pytz.UTC) > latestDate
-    ]
+    # NOTE: Dates are compared by their wall clock time, timezones are ignored.
+    latest_key = format_date.date_key(latestDate)
+
+    return Filter(
+        f"latest date {latestDate}",
+        lambda d: not d.is_raw() and d.date is not None and d.date > latest_key,
+    )
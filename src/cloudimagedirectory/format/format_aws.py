@@ -1,6 +1,30 @@
+import functools
 import re
 
 
+# See the Regex101 link of parse_image_name_rhel to tinker with this regex.
+# Each group is named to make it easier to handle parsed data. Explanation of
+# names:
+#
+#     intprod = internal product (such as HA)
+#     extprod = external product (such as SAP)
+#     version = RHEL version (such as 9.0.0)
+#     virt = virtualization type (such as HVM)
+#     beta = beta vs non-beta release
+#     date = date image was produced
+#     arch = architecture (such as x86_64 or arm64)
+#     release = release number of the image
+#     billing = Hourly2 or Access2  #noqa: E800
+#     storage = storage type (almost always GP2)
+#
+AWS_IMAGE_NAME_REGEX = re.compile(
+    r"RHEL_*(?P<intprod>\w*)?-*(?P<extprod>\w*)?-(?P<version>[\d\-\.]*)_"
+    r"(?P<virt>[A-Z]*)_*(?P<beta>\w*)?-(?P<date>\d+)-(?P<arch>\w*)-"
+    r"(?P<release>\d+)-(?P<billing>[\w\d]*)-(?P<storage>\w*)",
+    re.IGNORECASE,
+)
+
+
 def parse_image_name_rhel(image_name: str) -> dict[str, str]:
     """Parse an AWS image name and return extra data about the image.
 
@@ -13,26 +37,13 @@ def parse_image_name_rhel(image_name: str) -> dict[str, str]:
     Returns:
         Dictionary with additional information about the image.
     """
-    # See Regex101 link above to tinker with this regex. Each group is named to make
-    # it easier to handle parsed data. Explanation of names:
-    #
-    #     intprod = internal product (such as HA)
-    #     extprod = external product (such as SAP)
-    #     version = RHEL version (such as 9.0.0)
-    #     virt = virtualization type (such as HVM)
-    #     beta = beta vs non-beta release
-    #     date = date image was produced
-    #     arch = architecture (such as x86_64 or arm64)
-    #     release = release number of the image
-    #     billing = Hourly2 or Access2  #noqa: E800
-    #     storage = storage type (almost always GP2)
-    #
-    aws_image_name_regex = (
-        r"RHEL_*(?P<intprod>\w*)?-*(?P<extprod>\w*)?-(?P<version>[\d\-\.]*)_"
-        r"(?P<virt>[A-Z]*)_*(?P<beta>\w*)?-(?P<date>\d+)-(?P<arch>\w*)-"
-        r"(?P<release>\d+)-(?P<billing>[\w\d]*)-(?P<storage>\w*)"
-    )
-    matches = re.match(aws_image_name_regex, image_name, re.IGNORECASE)
+    return dict(match_image_name_rhel(image_name))
+
+
+@functools.lru_cache(maxsize=4096)
+def match_image_name_rhel(image_name: str) -> dict[str, str]:
+    """Match the image name once, the result is shared by all callers."""
+    matches = AWS_IMAGE_NAME_REGEX.match(image_name)
     if matches:
         return matches.groupdict()
 
@@ -50,20 +61,11 @@ def image_rhel(image: dict[str, str], region: str) -> dict[str, str]:
         JSON like structure containing streamlined image
         information.
     """
-    additional_information = parse_image_name_rhel(image["Name"])
-
     arch = image["Architecture"]
     image_id = image["ImageId"]
     virt_type = image["VirtualizationType"]
     date = image["CreationDate"]
-    version = additional_information["version"]
-    beta = additional_information["beta"]
-    billing = additional_information["billing"]
-    extprod = additional_information["extprod"]
-    intprod = additional_information["intprod"]
-    name_parts = ["RHEL", version, intprod, extprod, virt_type, arch, billing, beta]
-
-    name = " ".join([x for x in name_parts if x != ""])
+    name, version = image_template_rhel(image["Name"], arch, virt_type)
     selflink = (
         f"https://console.aws.amazon.com/ec2/home?region={region}#launchAmi={image_id}"
     )
@@ -78,3 +80,25 @@ def image_rhel(image: dict[str, str], region: str) -> dict[str, str]:
         "selflink": selflink,
         "region": region,
     }
+
+
+@functools.lru_cache(maxsize=4096)
+def image_template_rhel(image_name: str, arch: str, virt_type: str) -> tuple[str, str]:
+    """Compile the region independent information of an image.
+
+    The same image is published in every region, so its name is parsed once
+    and the display name and version are shared by the images of all
+    regions.
+
+    Returns:
+        Tuple of the display name and the RHEL version.
+    """
+    additional_information = match_image_name_rhel(image_name)
+    version = additional_information["version"]
+    beta = additional_information["beta"]
+    billing = additional_information["billing"]
+    extprod = additional_information["extprod"]
+    intprod = additional_information["intprod"]
+    name_parts = ["RHEL", version, intprod, extprod, virt_type, arch, billing, beta]
+
+    return " ".join([x for x in name_parts if x != ""]), version
@@ -1,8 +1,22 @@
+import functools
 import re
 
 from datetime import datetime
 
 
+# See the Regex101 link of parse_image_version_rhel to tinker with this regex.
+# Each group is named to make it easier to handle parsed data. Explanation of
+# names:
+#
+#     version = RHEL version (such as 9.0)
+#     date = date image was produced
+#
+AZURE_IMAGE_VERSION_REGEX = re.compile(
+    r"(?P<version>[\d]+\.[\d]+(?:\.[\d]+)?)\.(?P<date>\d{4}\d{2}\d{2})",
+    re.IGNORECASE,
+)
+
+
 def parse_image_version_rhel(image_version: str) -> dict[str, str]:
     """Parse an AWS image name and return extra data about the image.
 
@@ -15,16 +29,13 @@ def parse_image_version_rhel(image_version: str) -> dict[str, str]:
     Returns:
         Dictionary with additional information about the image.
     """
-    # See Regex101 link above to tinker with this regex. Each group is named to make
-    # it easier to handle parsed data. Explanation of names:
-    #
-    #     version = RHEL version (such as 9.0)
-    #     date = date image was produced
-    #
-    aws_image_name_regex = (
-        r"(?P<version>[\d]+\.[\d]+(?:\.[\d]+)?)\.(?P<date>\d{4}\d{2}\d{2})"
-    )
-    matches = re.match(aws_image_name_regex, image_version, re.IGNORECASE)
+    return dict(match_image_version_rhel(image_version))
+
+
+@functools.lru_cache(maxsize=4096)
+def match_image_version_rhel(image_version: str) -> dict[str, str]:
+    """Match the image version, repeated versions are served from the cache."""
+    matches = AZURE_IMAGE_VERSION_REGEX.match(image_version)
     if matches:
         return matches.groupdict()
 
@@ -0,0 +1,58 @@
+import re
+
+from datetime import datetime
+from typing import Union
+
+
+# NOTE: Dates are ISO 8601 like, with an optional time, fraction of a second
+# and timezone: 2022-11-02, 2022-09-06T13:00:02.000Z or
+# 2022-11-02T12:34:56.789-07:00
+DATE_REGEX = re.compile(
+    r"\s*(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})"
+    r"(?:[T ](?P<hour>\d{1,2}):(?P<minute>\d{2})"
+    r"(?::(?P<second>\d{2})(?:[.,](?P<fraction>\d+))?)?)?"
+    r"\s*(?:Z|[+-]\d{2}(?::?\d{2})?)?\s*",
+    re.IGNORECASE,
+)
+
+
+def date_key(date: Union[str, datetime]) -> str:
+    """Normalize a date into a key that sorts in chronological order.
+
+    The key is the wall clock time in the form YYYY-MM-DDTHH:MM:SS.fffffffff,
+    the timezone is ignored like it is when the date filter replaces it. The
+    day of the date is key[:10].
+
+    Args:
+        date: Date string as formatted for an image, or a datetime.
+
+    Returns:
+        Fixed width date string.
+
+    Raises:
+        ValueError: If the date can't be parsed.
+    """
+    if isinstance(date, datetime):
+        nanosecond = getattr(date, "nanosecond", 0)
+        return (
+            f"{date.year:04d}-{date.month:02d}-{date.day:02d}T{date.hour:02d}:"
+            f"{date.minute:02d}:{date.second:02d}."
+            f"{date.microsecond:06d}{nanosecond:03d}"
+        )
+
+    matches = DATE_REGEX.fullmatch(date)
+    if not matches:
+        raise ValueError(f"Invalid date: {date}")
+
+    parts = matches.groupdict(default="0")
+    # NOTE: Validates the date, e.g. rejects a 13th month.
+    value = datetime(
+        int(parts["year"]),
+        int(parts["month"]),
+        int(parts["day"]),
+        int(parts["hour"]),
+        int(parts["minute"]),
+        int(parts["second"]),
+    )
+    fraction = parts["fraction"][:9].ljust(9, "0")
+    return f"{value:%Y-%m-%dT%H:%M:%S}.{fraction}"
@@ -1,6 +1,14 @@
+import functools
 import re
 
 
+GOOGLE_IMAGE_NAME_REGEX = re.compile(
+    r"(?P<product>\w*)-(?P<version>[\d]+(?:\-[\d]){0,3})-?"
+    r"(?P<extprod>\w*)?-v(?P<date>\d{4}\d{2}\d{2})",
+    re.IGNORECASE,
+)
+
+
 def parse_image_name_rhel(image_name: str) -> dict[str, str]:
     """Parse an google image name and return version string.
 
@@ -13,12 +21,13 @@ def parse_image_name_rhel(image_name: str) -> dict[str, str]:
     Returns:
         Dictionary with additional information about the image.
     """
-    google_image_name_regex = (
-        r"(?P<product>\w*)-(?P<version>[\d]+(?:\-[\d]){0,3})-?"
-        r"(?P<extprod>\w*)?-v(?P<date>\d{4}\d{2}\d{2})"
-    )
+    return dict(match_image_name_rhel(image_name))
+
 
-    matches = re.match(google_image_name_regex, image_name, re.IGNORECASE)
+@functools.lru_cache(maxsize=4096)
+def match_image_name_rhel(image_name: str) -> dict[str, str]:
+    """Match the image name, the cached groups must not be modified."""
+    matches = GOOGLE_IMAGE_NAME_REGEX.match(image_name)
     if matches:
         return matches.groupdict()
 
@@ -0,0 +1,137 @@
+"""Serializes JSON data with the fastest available backend.
+
+If orjson is installed it is used to parse JSON and to write compact or
+two-space indented JSON, otherwise the standard library is used. The written
+JSON is always byte-identical to the output of json.dumps with the same
+arguments, data that orjson would format differently falls back to the
+standard library. JSON with the default separators of json.dumps, like the
+transformer pages, is always written by the standard library, so only
+reading it is accelerated.
+"""
+import json
+
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+COMPACT_SEPARATORS = (",", ":")
+SCALARS = frozenset((str, int, bool, type(None)))
+
+
+def backend() -> str:
+    """Return the name of the backend that is used."""
+    if orjson is None:
+        return "json"
+    return "orjson"
+
+
+def loads(data: Any) -> Any:
+    """Parse a JSON document from a str or bytes."""
+    if orjson is not None:
+        try:
+            result = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # NOTE: orjson rejects NaN and Infinity, which the standard
+            # library accepts.
+            pass
+        else:
+            # NOTE: orjson parses integers beyond 64 bit to floats, data with
+            # floats is parsed again by the standard library to keep them.
+            if not has_float(result):
+                return result
+    return json.loads(data)
+
+
+def dumps(
+    obj: Any,
+    indent: Optional[int] = None,
+    sort_keys: bool = False,
+    separators: Optional[tuple[str, str]] = None,
+    default: Optional[Callable] = None,
+) -> str:
+    """Serialize the object to a JSON formatted str like json.dumps.
+
+    The fast backend is used for compact output and for output indented by
+    two spaces, if the data contains only ASCII strings and no floats. The
+    default separators of json.dumps can't be produced by orjson and
+    converting its output is slower than the standard library, so that
+    output is always written by the standard library.
+    """
+    if orjson is not None and is_fast(indent, separators) and not has_float(obj):
+        option = 0
+        if indent is not None:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        # NOTE: orjson formats dates and dataclasses on its own, pass them to
+        # the default function like the standard library does.
+        option |= orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        try:
+            data = orjson.dumps(obj, default=checked(default), option=option)
+        except TypeError:
+            data = None
+        # NOTE: The standard library escapes all non ASCII characters and DEL,
+        # orjson writes them as they are.
+        if data is not None and data.isascii() and b"\x7f" not in data:
+            return data.decode()
+
+    return json.dumps(
+        obj, indent=indent, sort_keys=sort_keys, separators=separators, default=default
+    )
+
+
+def is_fast(indent: Optional[int], separators: Optional[tuple[str, str]]) -> bool:
+    """Check whether orjson supports the formatting options."""
+    if indent is None:
+        return separators is not None and tuple(separators) == COMPACT_SEPARATORS
+    return indent == 2 and separators is None
+
+
+def checked(default: Optional[Callable]) -> Optional[Callable]:
+    """Wrap the default function to reject floats in its results."""
+    if default is None:
+        return None
+
+    def wrapper(obj):
+        result = default(obj)
+        if has_float(result):
+            raise TypeError("floats are written by the standard library")
+        return result
+
+    return wrapper
+
+
+def has_float(obj: Any) -> bool:
+    """Check whether the data contains a float.
+
+    Containers that hold only strings, integers, booleans and None are
+    checked at once, which is the common case for image data.
+    """
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        values: Iterable[Any]
+        if isinstance(item, dict):
+            values = item.values()
+        elif isinstance(item, (list, tuple)):
+            values = item
+        else:
+            if isinstance(item, float):
+                return True
+            continue
+
+        if SCALARS.issuperset(map(type, values)):
+            continue
+        for value in values:
+            if isinstance(value, (dict, list, tuple)):
+                stack.append(value)
+            elif isinstance(value, float):
+                return True
+    return False
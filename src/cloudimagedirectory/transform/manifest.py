@@ -0,0 +1,173 @@
+"""Keeps track of the files processed by previous transformer runs."""
+import functools
+import hashlib
+import os
+
+from pathlib import Path
+
+from cloudimagedirectory import config
+from cloudimagedirectory.connection import connection
+from cloudimagedirectory.format import format_aws
+from cloudimagedirectory.format import format_azure
+from cloudimagedirectory.format import format_date
+from cloudimagedirectory.format import format_google
+from cloudimagedirectory.serialize import serialize
+from cloudimagedirectory.transform import transform
+
+
+MANIFEST_FORMAT = 2
+
+# NOTE: The modules that produce the transformed entries, a change to any of
+# them invalidates the outputs stored in the manifest.
+SOURCE_MODULES = (
+    config,
+    connection,
+    format_aws,
+    format_azure,
+    format_date,
+    format_google,
+    transform,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def fingerprint() -> str:
+    """Hash the sources of the modules that produce the transformed entries."""
+    digest = hashlib.sha256()
+    for module in SOURCE_MODULES:
+        digest.update(module.__name__.encode())
+        digest.update(Path(str(module.__file__)).read_bytes())
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Persisted state of an incremental transformation.
+
+    For every raw file the manifest stores its size, modification time and
+    content hash together with the entries transformed from it. Raw files
+    that did not change since the last run are not read again, their
+    entries are restored from the manifest instead.
+
+    For every written page the manifest stores the hash of its content, so
+    pages that did not change are not written again.
+    """
+
+    def __init__(self, path: str, destination: str):
+        """Initialize an empty manifest."""
+        self.path = path
+        self.destination = destination
+        self.files: dict = {}
+        self.pages: dict = {}
+        self.seen_files: dict = {}
+        self.seen_pages: set = set()
+
+    @classmethod
+    def load(cls, path: str, destination: str) -> "Manifest":
+        """Load the manifest of the previous run.
+
+        The previous state is discarded if it was written by another version
+        of the transformers or formatters, for another destination, or if the
+        destination doesn't exist anymore.
+        """
+        manifest = cls(path, destination)
+        if not os.path.exists(path) or not os.path.isdir(destination):
+            return manifest
+
+        state = serialize.loads(Path(path).read_bytes())
+        if (
+            state.get("format") != MANIFEST_FORMAT
+            or state.get("fingerprint") != fingerprint()
+            or state.get("destination") != destination
+        ):
+            print("manifest is outdated, transform all files")
+            return manifest
+
+        manifest.files = state["files"]
+        manifest.pages = state["pages"]
+        return manifest
+
+    def save(self):
+        """Persist the state of the current run."""
+        state = {
+            "format": MANIFEST_FORMAT,
+            "fingerprint": fingerprint(),
+            "destination": self.destination,
+            "files": self.seen_files,
+            "pages": {x: self.pages[x] for x in self.seen_pages},
+        }
+        tmp = self.path + ".tmp"
+        Path(tmp).write_text(
+            serialize.dumps(state, separators=serialize.COMPACT_SEPARATORS)
+        )
+        os.replace(tmp, self.path)
+
+    def changed(self, conn, entries):
+        """Return the raw entries that changed since the last run.
+
+        Only files whose size or modification time changed are hashed.
+        """
+        results = []
+        for entry in entries:
+            size, mtime = conn.get_stat(entry)
+            record = self.files.get(entry.filename)
+            if record is not None and record["outputs"] is None:
+                record = None
+            if record is not None and (record["size"], record["mtime"]) == (
+                size,
+                mtime,
+            ):
+                self.seen_files[entry.filename] = record
+                continue
+
+            digest = conn.get_hash(entry)
+            if record is not None and record["hash"] == digest:
+                record = dict(record, size=size, mtime=mtime)
+                self.seen_files[entry.filename] = record
+                continue
+
+            self.seen_files[entry.filename] = {
+                "size": size,
+                "mtime": mtime,
+                "hash": digest,
+                "outputs": None,
+            }
+            results.append(entry)
+
+        return results
+
+    def outputs(self, entry):
+        """Restore the transformed entries of an unchanged raw entry."""
+        return [
+            connection.DataEntry(filename, content)
+            for filename, content in self.seen_files[entry.filename]["outputs"]
+        ]
+
+    def record(self, entry, outputs):
+        """Remember the transformed entries of a changed raw entry."""
+        self.seen_files[entry.filename]["outputs"] = [
+            [x.filename, x.content] for x in outputs
+        ]
+
+    def page_changed(self, data) -> bool:
+        """Check whether a page differs from the last written content.
+
+        A page with the same content is written again if the file is missing
+        or doesn't have the size of the content anymore.
+        """
+        payload = connection.encode_page(data.content)
+        digest = hashlib.sha256(payload).hexdigest()
+        self.seen_pages.add(data.filename)
+        if self.pages.get(data.filename) == digest and self.is_written(
+            data.filename, len(payload)
+        ):
+            return False
+
+        self.pages[data.filename] = digest
+        return True
+
+    def is_written(self, filename: str, size: int) -> bool:
+        """Check whether the file exists with the size of the written page."""
+        try:
+            return os.path.getsize(filename) == size
+        except OSError:
+            return False
@@ -1,13 +1,16 @@
 """Transforms the raw data into useful data."""
 import os
 
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
 
 from cloudimagedirectory import config
 from cloudimagedirectory.connection import connection
 from cloudimagedirectory.format import format_aws
 from cloudimagedirectory.format import format_azure
+from cloudimagedirectory.format import format_date
 from cloudimagedirectory.format import format_google
 
 
@@ -24,247 +27,459 @@ class Pipeline:
         transformer_funcs: list[Callable],
         filter_funcs: list[Callable],
         idx_generator_funcs: list[Callable],
+        workers: int = 1,
+        executor: str = "thread",
+        manifest=None,
     ):
-        """Initialize the pipeline."""
+        """Initialize the pipeline.
+
+        Args:
+            workers: Number of raw files to load and parse concurrently.
+            executor: Either "thread" to load raw files on a thread pool, or
+                "process" to shard the raw files by provider and region and
+                transform them on a process pool.
+            manifest: Optional manifest of the previous run. Raw files that
+                did not change since then are not transformed again.
+        """
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor: {executor}")
+
         self.src_conn = src_conn
         self.filter_funcs = filter_funcs
+        self.workers = workers
+        self.executor = executor
+        self.manifest = manifest
+        self.transformers = []
+        self.idx_generators = []
         for transformer_func in transformer_funcs:
-            self.transformers.append(transformer_func(self.src_conn))
+            self.transformers.append(transformer_func(self.src_conn, workers))
         for idx_generator_func in idx_generator_funcs:
             self.idx_generators.append(idx_generator_func(self.src_conn))
 
     def run(self, data):
         """Run the pipeline."""
         results = data
-        for transformer in self.transformers:
-            results.extend(transformer.run(results))
+        for entries in self.transform(results):
+            results.extend(entries)
 
         generated_pages = len(results)
         print("total images: ", generated_pages)
 
-        for filter_func in self.filter_funcs:
-            before = generated_pages
-            results = filter_func(results)
-            after = len(results)
-            if before != after:
-                print(f"filtered {before - after} items")
+        results = self.filter(results)
 
         generated_pages = len(results)
 
+        buckets = bucket(results)
         for idx_generator in self.idx_generators:
-            results.extend(idx_generator.run(results))
+            results.extend(idx_generator.run(select(buckets, idx_generator)))
 
         print(f"generated indexes: {len(results) - generated_pages}")
 
         return results
 
+    def filter(self, data):
+        """Apply all filters in a single pass over the data.
+
+        An entry is dropped by the first filter it doesn't match, the number
+        of entries every filter dropped is reported. Filters without a match
+        method are applied to the whole list afterwards.
+        """
+        filters = [x for x in self.filter_funcs if hasattr(x, "match")]
+        matches = [x.match for x in filters]
+        dropped = [0] * len(filters)
+        results = []
+        for entry in data:
+            for i, match in enumerate(matches):
+                if not match(entry):
+                    dropped[i] += 1
+                    break
+            else:
+                results.append(entry)
+
+        for filter_func, count in zip(filters, dropped):
+            if count != 0:
+                print(f"filtered {count} items by {filter_func.name}")
+
+        for filter_func in self.filter_funcs:
+            if hasattr(filter_func, "match"):
+                continue
+            before = len(results)
+            results = filter_func(results)
+            if before != len(results):
+                print(f"filtered {before - len(results)} items")
+
+        return results
+
+    def transform(self, data):
+        """Transform the raw data.
+
+        Yields:
+            The list of entries transformed from every raw entry, in the
+            order of the transformers and the raw entries.
+        """
+        if self.executor == "process" and self.workers > 1:
+            yield from self.transform_sharded(data)
+            return
+
+        buckets = bucket(data)
+        for transformer in self.transformers:
+            if not isinstance(transformer, TransformerRaw):
+                yield transformer.run(data)
+                continue
+
+            entries = select(buckets, transformer)
+            changed = self.changed(entries)
+            loaded = transformer.load(changed)
+            pending = set(changed)
+            for entry in entries:
+                if entry not in pending:
+                    yield self.manifest.outputs(entry)
+                    continue
+
+                raw = next(loaded)
+                results = transformer.transform(raw)
+                self.record(raw, results)
+                # NOTE: The parsed raw file is not needed anymore.
+                raw.evict()
+                yield results
+
+    def transform_sharded(self, data):
+        """Transform the raw data on a process pool.
+
+        Every raw entry holds the images of one provider and region and is
+        sent as a separate shard to the pool. The results are collected in
+        the same order as the serial pipeline would produce them.
+        """
+        buckets = bucket(data)
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            shards = []
+            for transformer in self.transformers:
+                if not isinstance(transformer, TransformerRaw):
+                    shards.append((transformer, None, None))
+                    continue
+
+                entries = select(buckets, transformer)
+                pending = set(self.changed(entries))
+                for entry in entries:
+                    future = None
+                    if entry in pending:
+                        future = executor.submit(transform_shard, transformer, entry)
+                    shards.append((transformer, entry, future))
+
+            for transformer, entry, future in shards:
+                if entry is None:
+                    yield transformer.run(data)
+                elif future is None:
+                    yield self.manifest.outputs(entry)
+                else:
+                    results = [
+                        connection.DataEntry(filename, content)
+                        for filename, content in future.result()
+                    ]
+                    self.record(entry, results)
+                    yield results
+
+    def changed(self, entries):
+        """Select the raw entries that have to be transformed."""
+        if self.manifest is None:
+            return entries
+
+        changed = self.manifest.changed(self.src_conn, entries)
+        print(f"unchanged raw files: {len(entries) - len(changed)}")
+        return changed
+
+    def record(self, entry, results):
+        """Record the transformed entries of a raw entry in the manifest."""
+        if self.manifest is not None:
+            self.manifest.record(entry, results)
+
+
+def bucket(entries) -> dict[tuple[str, str], list]:
+    """Group the entries by kind and by kind and provider.
+
+    The entries of every kind are stored under (kind, ""), the entries of a
+    single provider under (kind, provider), both in the order of the input.
+    """
+    buckets: dict[tuple[str, str], list] = {}
+    for entry in entries:
+        buckets.setdefault((entry.kind, ""), []).append(entry)
+        if entry.provider is not None:
+            buckets.setdefault((entry.kind, entry.provider), []).append(entry)
+    return buckets
+
+
+def select(buckets, stage) -> list:
+    """Select the entries a pipeline stage works on."""
+    return buckets.get((stage.kind, stage.provider), [])
+
+
+def transform_shard(transformer, entry):
+    """Transform a single raw entry in a worker process.
+
+    Returns:
+        List of (filename, content) tuples, which are cheaper to send back
+        to the parent process than full data entries.
+    """
+    raw = transformer.src_conn.get_content(entry)
+    return [(x.filename, x.content) for x in transformer.transform(raw)]
+
 
 class Transformer:
-    """Base class for transforming raw image data."""
+    """Base class for transforming raw image data.
 
-    def __init__(self, src_conn):
+    The kind and provider select the entries the pipeline passes to the
+    transformer, an empty provider selects the entries of all providers.
+    """
+
+    kind = connection.KIND_IMAGE
+    provider = ""
+
+    def __init__(self, src_conn, workers: int = 1):
         """Initialize the transformer."""
         self.src_conn = src_conn
+        self.workers = workers
 
     def run(self, data):
         """Transform the raw data."""
         raise NotImplementedError
 
 
+class TransformerRaw(Transformer):
+    """Base class for transforming the raw data of a single provider."""
+
+    kind = connection.KIND_RAW
+
+    def entries(self, data):
+        """Select the raw entries of the provider."""
+        return [
+            x
+            for x in data
+            if x.kind == connection.KIND_RAW and x.provider == self.provider
+        ]
+
+    def load(self, entries):
+        """Load the content of the raw entries.
+
+        With more than one worker, files are read and parsed on a thread
+        pool. At most `workers` files are loaded ahead of the consumer and
+        the entries are always yielded in the order of the input.
+        """
+        if self.workers <= 1:
+            for entry in entries:
+                yield self.load_entry(entry)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending: deque = deque()
+            for entry in entries:
+                pending.append(executor.submit(self.load_entry, entry))
+                if len(pending) > self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def load_entry(self, entry):
+        """Load the content into the entry itself.
+
+        The loaded entry is the listed one, so evicting it after the
+        transformation frees the parsed file. Entries without a loader are
+        read through the source connection.
+        """
+        if not entry.is_loaded():
+            if entry.loader is None:
+                return self.src_conn.get_content(entry)
+            entry.content = entry.loader(entry)
+        return entry
+
+    def transform(self, raw):
+        """Transform the content of a single raw entry."""
+        raise NotImplementedError
+
+    def run(self, data):
+        """Transform the raw data."""
+        results = []
+        for raw in self.load(self.entries(data)):
+            results.extend(self.transform(raw))
+            raw.evict()
+
+        return results
+
+
 class TransformerIdxListImageLatest(Transformer):
     """Sort the transformed data, to have the latest images."""
 
     chunk_size = 50
-    provider = ""
 
     def run(self, data):
         """Sort the raw data."""
-        # NOTE: Verify that the data is not raw.
-        entries = [x for x in data if not x.is_raw() and not x.is_provided_by("idx")]
+        # NOTE: Verify that the data are images of the provider.
+        entries = [
+            x
+            for x in data
+            if x.kind == connection.KIND_IMAGE
+            and (self.provider == "" or x.provider == self.provider)
+        ]
 
         # NOTE: Sort the list of data by date
-        entries.sort(
-            key=lambda x: datetime.strptime(
-                "".join(x.content["date"].split("T")[0]), "%Y-%m-%d"
-            ),
-            reverse=True,
+        entries.sort(key=date_key, reverse=True)
+
+        items = [latest_item(entry) for entry in entries]
+        return paginate(items, self.provider, self.chunk_size)
+
+
+def date_key(entry):
+    """Return the day an image was published, to sort images by date."""
+    return entry.date[:10]
+
+
+def latest_item(entry) -> dict:
+    """Describe an image in the sort-by-date index."""
+    region = entry.region
+    if region is None:
+        region = "unkown"
+        print("warn: could not determine region of image: " + entry.filename)
+
+    return {
+        "name": entry.content["name"],
+        "date": entry.content["date"].split("T")[0],
+        # TODO: Evaluate if this can be removed
+        "provider": entry.provider or "unknown",
+        "ref": entry.filename,
+        "arch": entry.content["arch"],
+        "region": region,  # TODO: Evaluate if this can be removed
+    }
+
+
+def paginate(items: list, provider: str, chunk_size: int):
+    """Split the sort-by-date index of a provider into pages."""
+    # NOTE: Split the list of images into equally sized chunkes
+    chunked_list = []
+    chunk = []
+    for i, item in enumerate(items, 1):
+        chunk.append(item)
+        if len(items) == i or i % chunk_size == 0:
+            chunked_list.append(chunk)
+            chunk = []
+
+    if provider != "":
+        provider = "-" + provider
+
+    first = 0
+    results = []
+    for page in range(first, len(chunked_list)):
+        data_entry = connection.DataEntry(
+            f"idx/list/sort-by-date{provider}/{page}", chunked_list[page]
         )
+        results.append(data_entry)
 
-        list = []
-        for entry in entries:
-            provider = "unknown"
-            if entry.is_provided_by("aws"):
-                provider = "aws"
-            elif entry.is_provided_by("azure"):
-                provider = "azure"
-            elif entry.is_provided_by("google"):
-                provider = "google"
-
-            # NOTE: Filter images for pre-defined provider.
-            # If Provider is not set, all providers are valid.
-            if self.provider != "" and self.provider != provider:
-                continue
-
-            region = "unkown"
-            filename = entry.filename.split("/")
-            if len(filename) == 3:
-                region = filename[1]
-            else:
-                print("warn: could not determine region of image: " + entry.filename)
-
-            list.append(
-                {
-                    "name": entry.content["name"],
-                    "date": entry.content["date"].split("T")[0],
-                    "provider": provider,  # TODO: Evaluate if this can be removed
-                    "ref": entry.filename,
-                    "arch": entry.content["arch"],
-                    "region": region,  # TODO: Evaluate if this can be removed
-                }
-            )
-
-        # NOTE: Split the list of images into equally sized chunkes
-        chunked_list = []
-        chunk = []
-        for i, item in enumerate(list, 1):
-            chunk.append(item)
-            if len(list) == i or i % self.chunk_size == 0:
-                chunked_list.append(chunk)
-                chunk = []
-
-        provider = ""
-        if self.provider != "":
-            provider = "-" + self.provider
-
-        first = 0
-        results = []
-        for page in range(first, len(chunked_list)):
-            data_entry = connection.DataEntry(
-                f"idx/list/sort-by-date{provider}/{page}", chunked_list[page]
-            )
-            results.append(data_entry)
-
-        page_entry = connection.DataEntry(
-            f"idx/list/sort-by-date{provider}/pages",
-            {
-                "first": first,
-                "last": len(chunked_list) - 1,
-                "entries": self.chunk_size,
-            },
-        )
-        results.append(page_entry)
+    page_entry = connection.DataEntry(
+        f"idx/list/sort-by-date{provider}/pages",
+        {
+            "first": first,
+            "last": len(chunked_list) - 1,
+            "entries": chunk_size,
+        },
+    )
+    results.append(page_entry)
 
-        return results
+    return results
 
 
 class TransformerIdxListImageLatestGoogle(TransformerIdxListImageLatest):
     """Sort the transformed data to have the latest google images."""
 
-    def run(self, data):
-        self.provider = "google"
-        return super().run(data)
+    provider = "google"
 
 
 class TransformerIdxListImageLatestAWS(TransformerIdxListImageLatest):
     """Sort the transformed data to have the latest AWS images."""
 
-    def run(self, data):
-        self.provider = "aws"
-        return super().run(data)
+    provider = "aws"
 
 
 class TransformerIdxListImageLatestAZURE(TransformerIdxListImageLatest):
     """Sort the transformed data to have the latest AZURE images."""
 
-    def run(self, data):
-        self.provider = "azure"
-        return super().run(data)
+    provider = "azure"
 
 
-class TransformerAWS(Transformer):
+class TransformerAWS(TransformerRaw):
     """Transform raw AWS data."""
 
-    def run(self, data):
+    provider = "aws"
+
+    def transform(self, raw):
         """Transform the raw data."""
-        # NOTE: Verify that the data is from AWS.
-        entries = [x for x in data if x.is_provided_by("aws") and x.is_raw()]
+        region = os.path.basename(raw.filename).split(".")[0]
 
         results = []
-        for entry in entries:
-            raw = self.src_conn.get_content(entry)
-            region = os.path.basename(raw.filename).split(".")[0]
-
-            for content in raw.content:
-                if content["OwnerId"] != config.AWS_RHEL_OWNER_ID:
-                    continue
+        for content in raw.content:
+            if content["OwnerId"] != config.AWS_RHEL_OWNER_ID:
+                continue
 
-                image_data = format_aws.image_rhel(content, region)
-                image_name = image_data["name"].replace(" ", "_").lower()
-                data_entry = connection.DataEntry(
-                    f"aws/{region}/{image_name}", image_data
-                )
-                results.append(data_entry)
+            image_data = format_aws.image_rhel(content, region)
+            image_name = image_data["name"].replace(" ", "_").lower()
+            data_entry = connection.DataEntry(f"aws/{region}/{image_name}", image_data)
+            data_entry.date = format_date.date_key(image_data["date"])
+            results.append(data_entry)
 
         return results
 
 
-class TransformerGoogle(Transformer):
+class TransformerGoogle(TransformerRaw):
     """Transform raw google data."""
 
-    def run(self, data):
-        """Transform the raw data."""
-        entries = [x for x in data if x.is_provided_by("google") and x.is_raw()]
+    provider = "google"
 
+    def transform(self, raw):
+        """Transform the raw data."""
         results = []
-        for entry in entries:
-            raw = self.src_conn.get_content(entry)
-            for content in raw.content:
-                content["creation_timestamp"] = content["creationTimestamp"]
-                if "rhel" in content["name"]:
-                    image_data = format_google.image_rhel(content)
-                    image_name = image_data["name"].replace(" ", "_").lower()
-                    data_entry = connection.DataEntry(
-                        f"google/global/{image_name}", image_data
-                    )
-                    results.append(data_entry)
+        for content in raw.content:
+            content["creation_timestamp"] = content["creationTimestamp"]
+            if "rhel" in content["name"]:
+                image_data = format_google.image_rhel(content)
+                image_name = image_data["name"].replace(" ", "_").lower()
+                data_entry = connection.DataEntry(
+                    f"google/global/{image_name}", image_data
+                )
+                data_entry.date = format_date.date_key(image_data["date"])
+                results.append(data_entry)
 
         return results
 
 
-class TransformerAZURE(Transformer):
+class TransformerAZURE(TransformerRaw):
     """Transform raw Azure data."""
 
-    def run(self, data):
+    provider = "azure"
+
+    def transform(self, raw):
         """Transform the raw data."""
-        # NOTE: Verify that the data is from Azure.
-        entries = [x for x in data if x.is_provided_by("azure") and x.is_raw()]
+        region = os.path.basename(raw.filename).split(".")[0]
 
         results = []
-        for entry in entries:
-            raw = self.src_conn.get_content(entry)
-            region = os.path.basename(raw.filename).split(".")[0]
-
-            for content in raw.content:
-                if content["publisher"] != "RedHat":
-                    continue
+        for content in raw.content:
+            if content["publisher"] != "RedHat":
+                continue
 
-                content["hyperVGeneration"] = "unknown"
+            content["hyperVGeneration"] = "unknown"
 
-                try:
-                    image_data = format_azure.image_rhel(content)
-                    image_name = image_data["name"].replace(" ", "_").lower()
-                    data_entry = connection.DataEntry(
-                        f"azure/{region}/{image_name}", image_data
-                    )
+            try:
+                image_data = format_azure.image_rhel(content)
+                image_name = image_data["name"].replace(" ", "_").lower()
+                data_entry = connection.DataEntry(
+                    f"azure/{region}/{image_name}", image_data
+                )
+                data_entry.date = format_date.date_key(image_data["date"])
 
-                    results.append(data_entry)
-                except:
-                    print(
-                        "Could not format image, sku: "
-                        + content["sku"]
-                        + " offer: "
-                        + content["offer"]
-                    )
+                results.append(data_entry)
+            except:
+                print(
+                    "Could not format image, sku: "
+                    + content["sku"]
+                    + " offer: "
+                    + content["offer"]
+                )
 
         return results
 
@@ -274,8 +489,8 @@ class TransformerIdxListImageNames(Transformer):
 
     def run(self, data):
         """Sort the raw data."""
-        # NOTE: Verify that the data is not raw.
-        entries = [x for x in data if not x.is_raw() and not x.is_provided_by("idx")]
+        # NOTE: Verify that the data are images.
+        entries = [x for x in data if x.kind == connection.KIND_IMAGE]
 
         results = []
 
@@ -285,3 +500,39 @@ class TransformerIdxListImageNames(Transformer):
         results.sort()
 
         return [connection.DataEntry("idx/list/image-names", results)]
+
+
+class TransformerIdxListAll(Transformer):
+    """Generate the list of image names and all sort-by-date indexes.
+
+    The images are sorted by date once. The global index and the index of
+    every provider are paginated from that single sorted list, which gives
+    the same pages as TransformerIdxListImageNames, TransformerIdxListImageLatest
+    and its provider subclasses.
+    """
+
+    chunk_size = 50
+    providers = ["google", "aws", "azure"]
+
+    def run(self, data):
+        """Generate the indexes."""
+        # NOTE: Verify that the data are images.
+        entries = [x for x in data if x.kind == connection.KIND_IMAGE]
+        results = [
+            connection.DataEntry(
+                "idx/list/image-names", sorted(x.filename for x in entries)
+            )
+        ]
+
+        entries.sort(key=date_key, reverse=True)
+        lists: dict[str, list] = {x: [] for x in ["", *self.providers]}
+        for entry in entries:
+            item = latest_item(entry)
+            lists[""].append(item)
+            if entry.provider in lists:
+                lists[entry.provider].append(item)
+
+        for provider, items in lists.items():
+            results.extend(paginate(items, provider, self.chunk_size))
+
+        return results
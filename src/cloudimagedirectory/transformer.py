@@ -1,10 +1,14 @@
 import datetime
 
+from typing import Callable
+
 import click
-import pandas as pd
 
 from cloudimagedirectory.connection import connection
+from cloudimagedirectory.connection import writer
 from cloudimagedirectory.filter import filter
+from cloudimagedirectory.format import format_date
+from cloudimagedirectory.transform import manifest
 from cloudimagedirectory.transform import transform
 
 
@@ -14,14 +18,14 @@ from cloudimagedirectory.transform import transform
     "--origin.path",
     "origin_path",
     prompt="Origin filesystem path",
-    help="The path to the filesystem source",
+    help="The path to the filesystem source, or an s3://bucket/prefix URL",
 )
 @click.option(
     "-dp",
     "--destination.path",
     "destination_path",
     prompt="Destination filesystem path",
-    help="The path to the filesystem destination",
+    help="The path to the filesystem destination, or an s3://bucket/prefix URL",
 )
 @click.option(
     "-fu",
@@ -42,30 +46,116 @@ from cloudimagedirectory.transform import transform
     prompt="files to process",
     help="List of predefined files to process",
 )
+@click.option(
+    "-x",
+    "--filter.exclude",
+    "filter_exclude",
+    default="test,beta",
+    show_default=True,
+    help="Comma separated words, images with any of them in their filename are ignored",
+)
+@click.option(
+    "-w",
+    "--workers",
+    "workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of raw files to load and parse concurrently",
+)
+@click.option(
+    "-e",
+    "--executor",
+    "executor",
+    default="thread",
+    show_default=True,
+    type=click.Choice(["thread", "process"]),
+    help=(
+        "Run the workers as threads that load the raw files, or as processes"
+        " that transform the raw files sharded by provider and region"
+    ),
+)
+@click.option(
+    "-i",
+    "--incremental",
+    "incremental",
+    is_flag=True,
+    default=False,
+    help=(
+        "Only transform raw files and write pages that changed since the last"
+        " run, tracked in a manifest next to the destination path"
+    ),
+)
+@click.option(
+    "-s",
+    "--skip-unchanged",
+    "skip_unchanged",
+    is_flag=True,
+    default=False,
+    help=(
+        "Don't rewrite destination files that already contain the same data,"
+        " S3 objects are skipped if their listed ETag matches the new content"
+    ),
+)
+@click.option(
+    "--stream",
+    "stream",
+    is_flag=True,
+    default=False,
+    help="Parse the raw files image by image instead of loading them at once",
+)
 def run(
-    origin_path: str, destination_path: str, api: str, arg_files: str, filter_until: str
+    origin_path: str,
+    destination_path: str,
+    api: str,
+    arg_files: str,
+    filter_until: str,
+    filter_exclude: str,
+    workers: int,
+    executor: str,
+    incremental: bool,
+    skip_unchanged: bool,
+    stream: bool,
 ) -> None:
     """Get content from filesystem format image data."""
     target: list[str] = []
     if arg_files != "none":
         target = arg_files.split(",")
-    origin_connection = connection.ConnectionFS(origin_path, target)
+    if incremental and destination_path.startswith("s3://"):
+        raise click.UsageError("--incremental requires a filesystem destination")
+
+    origin_connection = connection.open_connection(
+        origin_path, target, stream=stream, workers=workers
+    )
+    destination_connection = connection.open_connection(
+        destination_path, [], skip_unchanged, workers=workers
+    )
     filenames = origin_connection.get_filenames()
     for file in filenames:
         print("input: " + file.filename)
 
-    filters = [
-        filter.FilterImageByFilename("test"),
-        filter.FilterImageByFilename("beta"),
-    ]
+    filters: list[Callable] = [filter.FilterImageByFilenames(filter_exclude.split(","))]
 
     if filter_until == "default":
         # NOTE: Subtract 2 years from current time
         filter_after = datetime.datetime.now() - datetime.timedelta(days=2 * 365)
         filters.append(filter.FilterImageByLatestUpdate(filter_after))
     elif filter_until != "" and filter_until != "none":
-        filter_after = pd.to_datetime(filter_until)
-        filters.append(filter.FilterImageByLatestUpdate(filter_after))
+        filters.append(filter.FilterImageByLatestUpdate(parse_date(filter_until)))
+
+    version_prefix = ""
+    if api != "":
+        version_prefix = api + "/"
+
+    # NOTE: A trailing slash of the destination would end up in the S3 keys
+    # and in the destination recorded by the manifest.
+    destination_prefix = destination_path.rstrip("/") + "/" + version_prefix
+
+    run_manifest = None
+    if incremental:
+        run_manifest = manifest.Manifest.load(
+            destination_path.rstrip("/") + ".manifest.json", destination_prefix
+        )
 
     pipeline = transform.Pipeline(
         origin_connection,
@@ -75,21 +165,48 @@ def run(
             transform.TransformerGoogle,
         ],
         filters,
-        [
-            transform.TransformerIdxListImageNames,
-            transform.TransformerIdxListImageLatest,
-            transform.TransformerIdxListImageLatestGoogle,
-            transform.TransformerIdxListImageLatestAWS,
-            transform.TransformerIdxListImageLatestAZURE,
-        ],
+        [transform.TransformerIdxListAll],
+        workers,
+        executor,
+        run_manifest,
     )
     print("run pipeline")
     results = pipeline.run(filenames)
 
-    version_prefix = ""
-    if api != "":
-        version_prefix = api + "/"
     for result in results:
-        result.filename = destination_path + "/" + version_prefix + result.filename
-        if not result.is_raw():
-            origin_connection.put_content(result)
+        result.filename = destination_prefix + result.filename
+
+    if run_manifest is not None or skip_unchanged:
+        # NOTE: Only the last entry written to a file is kept, so the earlier
+        # entries with the same filename don't have to be compared at all.
+        results = list({x.filename: x for x in results}.values())
+
+    unchanged = 0
+    with writer.BatchWriter(destination_connection, workers) as batch_writer:
+        for result in results:
+            if result.is_raw():
+                continue
+            if run_manifest is not None and not run_manifest.page_changed(result):
+                unchanged += 1
+                continue
+            batch_writer.put(result)
+
+    unchanged += batch_writer.skipped
+    print(f"written pages: {batch_writer.written}, unchanged pages: {unchanged}")
+
+    if run_manifest is not None:
+        run_manifest.save()
+
+
+def parse_date(date: str):
+    """Parse a date given on the command line.
+
+    ISO 8601 dates are parsed without pandas, which is only imported to
+    parse other formats.
+    """
+    try:
+        return format_date.date_key(date)
+    except ValueError:
+        import pandas as pd
+
+        return pd.to_datetime(date)
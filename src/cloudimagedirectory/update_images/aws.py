@@ -1,11 +1,56 @@
 """Update images from public cloud APIs."""
 from __future__ import annotations
 
-import re
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Iterator
 
 import boto3
 
+from botocore.config import Config
+
 from cloudimagedirectory import config
+from cloudimagedirectory.format import format_aws
+
+
+# NOTE: Clients are thread safe, but creating them is not. They are created
+# once per region under the lock and shared by all threads.
+CLIENT_CONFIG = Config(
+    max_pool_connections=max(10, config.AWS_MAX_WORKERS),
+    retries={"max_attempts": config.AWS_MAX_ATTEMPTS, "mode": "adaptive"},
+)
+clients: dict[str, Any] = {}
+clients_lock = threading.Lock()
+
+# NOTE: The image names are parsed by the transformer as well, both share
+# the implementation and its caches.
+parse_image_name = format_aws.parse_image_name_rhel
+format_image = format_aws.image_rhel
+
+
+def get_client(region: str) -> Any:
+    """Get the EC2 client of a region, the client is created once.
+
+    Args:
+        region: AWS region name, such as us-east-1
+
+    Returns:
+        EC2 client of the region.
+    """
+    with clients_lock:
+        client = clients.get(region)
+        if client is None:
+            client = boto3.client("ec2", region_name=region, config=CLIENT_CONFIG)
+            clients[region] = client
+        return client
+
+
+def clear_clients() -> None:
+    """Drop the cached clients, new ones are created on the next call."""
+    with clients_lock:
+        clients.clear()
 
 
 def get_regions() -> list[str]:
@@ -14,7 +59,7 @@ def get_regions() -> list[str]:
     Returns:
         List of AWS regions as strings.
     """
-    ec2 = boto3.client("ec2", region_name="us-east-1")
+    ec2 = get_client("us-east-1")
     # TODO(mhayden): Remove the opt-in-status filter below once AWS enables the
     #  additional regions for the account. The opt-in was requested on 2022-10-11 but
     #  it could take time before they are enabled.
@@ -27,20 +72,28 @@ def get_regions() -> list[str]:
     return sorted([x["RegionName"] for x in raw["Regions"]])
 
 
-def describe_images(region: str) -> list[dict[str, str]]:
-    """Make an API call to AWS to get a list of RHEL images in a region.
+def describe_images(region: str) -> Iterator[dict[str, str]]:
+    """Make API calls to AWS to get the RHEL images in a region.
+
+    The images are retrieved page by page and yielded as they arrive, so
+    a region is never held in memory as a whole.
 
     Args:
         region: AWS region name, such as us-east-1
 
-    Returns:
-        List of dictionaries containing image data.
+    Yields:
+        Dictionaries containing image data.
     """
-    ec2 = boto3.client("ec2", region_name=region)
-    raw = ec2.describe_images(
-        Owners=[config.AWS_RHEL_OWNER_ID], IncludeDeprecated=False
+    ec2 = get_client(region)
+    paginator = ec2.get_paginator("describe_images")
+    pages = paginator.paginate(
+        Owners=[config.AWS_RHEL_OWNER_ID],
+        IncludeDeprecated=False,
+        Filters=config.AWS_IMAGE_FILTERS,
+        PaginationConfig={"PageSize": config.AWS_PAGE_SIZE},
     )
-    return list(raw["Images"])
+    for page in pages:
+        yield from page["Images"]
 
 
 def get_images(region: str, image_type: str = "hourly") -> list[dict[str, str]]:
@@ -53,67 +106,72 @@ def get_images(region: str, image_type: str = "hourly") -> list[dict[str, str]]:
     Returns:
         List of dictionaries containing metadata about images.
     """
-    # Determine the right billing code for the UsageOperation field.
+    code = get_billing_code(image_type)
+
+    # Filter the results based on the billing code of the image.
+    images = describe_images(region)
+    return [x for x in images if x["UsageOperation"] == code]
+
 
+def get_billing_code(image_type: str) -> str:
+    """Determine the right billing code for the UsageOperation field.
+
+    Args:
+        image_type: hourly or cloudaccess
+
+    Returns:
+        Billing code of the image type.
+    """
     if image_type == "hourly":
-        billing_code = config.AWS_HOURLY_BILLING_CODE
+        return config.AWS_HOURLY_BILLING_CODE
     elif image_type == "cloudaccess":
-        billing_code = config.AWS_CLOUD_ACCESS_BILLING_CODE
-    else:
-        raise (NotImplementedError("Only hourly and cloudaccess types are supported."))
+        return config.AWS_CLOUD_ACCESS_BILLING_CODE
 
-    # Filter the results based on the billing code of the image.
-    images = describe_images(region)
-    return [x for x in images if x["UsageOperation"] == billing_code]
+    raise (NotImplementedError("Only hourly and cloudaccess types are supported."))
 
 
 def get_all_images(image_type: str = "hourly") -> dict[str, list[dict[str, str]]]:
     """Retrieve all RHEL images from all regions."""
-    regions = get_regions()
-    images_per_region = {}
-    for region in regions:
-        images = get_images(region, image_type=image_type)
-        images_per_region[region] = images
-
-    return images_per_region
+    return collect_images([image_type])[image_type]
 
 
-def parse_image_name(image_name: str) -> dict[str, str]:
-    """Parse an AWS image name and return extra data about the image.
+def collect_images(
+    image_types: list[str], regions: list[str] | None = None
+) -> dict[str, dict[str, list[dict[str, str]]]]:
+    """Retrieve RHEL images of several types from all regions.
 
-    Regex101: https://regex101.com/r/mXCl73/1
+    The regions are queried concurrently, with at most AWS_MAX_WORKERS
+    requests at a time. Every region is described once and its images are
+    split by the billing code of each image type.
 
     Args:
-        image_name: String containing the image name, such as:
-                    RHEL-9.0.0_HVM_BETA-20211026-x86_64-10-Hourly2-GP2
+        image_types: List of image types, hourly or cloudaccess
+        regions: List of regions, all regions by default
 
     Returns:
-        Dictionary with additional information about the image.
+        Dictionary with the images per region for every image type.
     """
-    # See Regex101 link above to tinker with this regex. Each group is named to make
-    # it easier to handle parsed data. Explanation of names:
-    #
-    #     intprod = internal product (such as HA)
-    #     extprod = external product (such as SAP)
-    #     version = RHEL version (such as 9.0.0)
-    #     virt = virtualization type (such as HVM)
-    #     beta = beta vs non-beta release
-    #     date = date image was produced
-    #     arch = architecture (such as x86_64 or arm64)
-    #     release = release number of the image
-    #     billing = Hourly2 or Access2  #noqa: E800
-    #     storage = storage type (almost always GP2)
-    #
-    aws_image_name_regex = (
-        r"RHEL_*(?P<intprod>\w*)?-*(?P<extprod>\w*)?-(?P<version>[\d\-\.]*)_"
-        r"(?P<virt>[A-Z]*)_*(?P<beta>\w*)?-(?P<date>\d+)-(?P<arch>\w*)-"
-        r"(?P<release>\d+)-(?P<billing>[\w\d]*)-(?P<storage>\w*)"
-    )
-    matches = re.match(aws_image_name_regex, image_name, re.IGNORECASE)
-    if matches:
-        return matches.groupdict()
+    billing_codes = {x: get_billing_code(x) for x in image_types}
+    if regions is None:
+        regions = get_regions()
+
+    def split_images(region: str) -> dict[str, list[dict[str, str]]]:
+        # NOTE: Images of other billing codes are dropped as they arrive.
+        region_images: dict[str, list[dict[str, str]]] = {x: [] for x in image_types}
+        for image in describe_images(region):
+            for image_type, code in billing_codes.items():
+                if image["UsageOperation"] == code:
+                    region_images[image_type].append(image)
+        return region_images
 
-    return {}
+    images: dict[str, dict[str, list[dict[str, str]]]] = {x: {} for x in image_types}
+    workers = max(1, min(config.AWS_MAX_WORKERS, len(regions)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for region, region_images in zip(regions, executor.map(split_images, regions)):
+            for image_type in image_types:
+                images[image_type][region] = region_images[image_type]
+
+    return images
 
 
 def format_all_images() -> object:
@@ -126,8 +184,9 @@ def format_all_images() -> object:
     """
     formatted_images: list[dict[str, str]] = []
 
-    hourly_images = get_all_images()
-    cloudaccess_images = get_all_images("cloudaccess")
+    images = collect_images(["hourly", "cloudaccess"])
+    hourly_images = images["hourly"]
+    cloudaccess_images = images["cloudaccess"]
 
     for region in hourly_images:
         for image in hourly_images[region]:
@@ -138,44 +197,3 @@ def format_all_images() -> object:
             formatted_images.append(format_image(image, region))
 
     return {"images": {"aws": formatted_images}}
-
-
-def format_image(image: dict[str, str], region: str) -> dict[str, str]:
-    """Compile a dictionary of important image information.
-
-    Args:
-        images: A dictionary containing metadata about the image.
-        region: Name of the image region.
-
-    Returns:
-        JSON like structure containing streamlined image
-        information.
-    """
-    additional_information = parse_image_name(image["Name"])
-
-    arch = image["Architecture"]
-    image_id = image["ImageId"]
-    virt_type = image["VirtualizationType"]
-    date = image["CreationDate"]
-    version = additional_information["version"]
-    beta = additional_information["beta"]
-    billing = additional_information["billing"]
-    extprod = additional_information["extprod"]
-    intprod = additional_information["intprod"]
-    name_parts = ["RHEL", version, intprod, extprod, virt_type, arch, billing, beta]
-
-    name = " ".join([x for x in name_parts if x != ""])
-    selflink = (
-        f"https://console.aws.amazon.com/ec2/home?region={region}#launchAmi={image_id}"
-    )
-
-    return {
-        "name": name,
-        "arch": arch,
-        "version": version,
-        "imageId": image_id,
-        "date": date,
-        "virt": virt_type,
-        "selflink": selflink,
-        "region": region,
-    }
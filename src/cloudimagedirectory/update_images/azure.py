@@ -1,10 +1,21 @@
 """Update images from public cloud APIs."""
 from __future__ import annotations
 
-import re
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
 import time
 
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+from typing import Callable
 
 import requests
 import structlog
@@ -13,16 +24,195 @@ from requests import HTTPError
 from requests import RequestException
 from requests import Timeout
 from requests import TooManyRedirects
+from requests.adapters import HTTPAdapter
 
 from cloudimagedirectory import config
+from cloudimagedirectory.format import format_azure
 
 
 logger = structlog.get_logger()
 
+# NOTE: The image versions are parsed by the transformer as well, both share
+# the implementation and its caches.
+parse_image_version = format_azure.parse_image_version_rhel
+convert_date = format_azure.convert_date_rhel
+format_image = format_azure.image_rhel
+
+
+def create_session() -> requests.Session:
+    """Create a session that keeps the connections to Azure alive.
+
+    The connection pool holds a connection for every worker, so concurrent
+    requests don't have to open new connections.
+
+    Returns:
+        Session shared by all Azure api calls.
+    """
+    adapter = HTTPAdapter(
+        pool_connections=4, pool_maxsize=max(10, config.AZURE_MAX_WORKERS)
+    )
+    new_session = requests.Session()
+    new_session.mount("https://", adapter)
+    new_session.mount("http://", adapter)
+    return new_session
+
+
+session = create_session()
+
+
+class RetryPolicy:
+    """Decides whether a failed Azure api call is retried and when.
+
+    Timeouts, throttled calls and server errors are retried with an
+    exponential backoff and full jitter, a Retry-After header takes
+    precedence. Other client errors can't succeed and fail at once. All
+    calls of a run share a budget of retries.
+    """
+
+    RETRY_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+
+    def __init__(self, backoff: float, max_backoff: float, budget: int):
+        """Initialize the retry policy."""
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.remaining = budget
+        self.lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Restore the retry budget for a new run."""
+        with self.lock:
+            self.remaining = self.budget
+
+    def should_retry(self, resp: requests.Response) -> bool:
+        """Check whether the response is worth a retry."""
+        # NOTE: A timeout results in an empty response without a status code.
+        return resp.status_code is None or resp.status_code in self.RETRY_STATUSES
+
+    def take(self) -> bool:
+        """Take a retry from the budget, if one is left."""
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def delay(self, attempt: int, resp: requests.Response) -> float:
+        """Get the time to wait before the next attempt."""
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header, given in seconds or as an HTTP date.
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+retry_policy = RetryPolicy(
+    config.AZURE_REQUEST_FAILURE_TIMEOUT,
+    config.AZURE_MAX_BACKOFF,
+    config.AZURE_RETRY_BUDGET,
+)
+
+
+def call_api(
+    send: Callable[[], requests.Response],
+    url: str,
+    error: str,
+    headers: dict[str, str] | None = None,
+) -> Any:
+    """Send a request until it succeeds, following the retry policy.
+
+    Args:
+        send: Function that sends the request
+        url: Url of the request
+        error: Message of the exception if the request fails
+        headers: Headers sent by the function, see send_request
+
+    Returns:
+        JSON content of the response.
+
+    Raises:
+        Exception: If no attempt succeeds.
+    """
+    return send_request(send, url, error, headers=headers).json()
+
+
+def send_request(
+    send: Callable[[], requests.Response],
+    url: str,
+    error: str,
+    statuses: tuple[int, ...] = (200,),
+    headers: dict[str, str] | None = None,
+) -> requests.Response:
+    """Send a request until it succeeds, following the retry policy.
+
+    If Azure rejects the bearer token in the headers, because it was revoked
+    or a cached token is stale, the token is dropped from the token cache and
+    the request is sent once more with a new token.
+
+    Args:
+        send: Function that sends the request
+        url: Url of the request
+        error: Message of the exception if the request fails
+        statuses: Status codes of a successful response
+        headers: Headers sent by the function, updated with a new token
+
+    Returns:
+        Successful response.
+
+    Raises:
+        Exception: If no attempt succeeds.
+    """
+    reauthenticated = False
+    for attempt in range(config.AZURE_MAX_RETRIES):
+        resp = send()
+        if resp.status_code == 401 and headers is not None and not reauthenticated:
+            reauthenticated = True
+            rejected = headers.get("Authorization", "").removeprefix("Bearer ")
+            logger.warning(f"Access token rejected by {url}, authenticate again")
+            token_provider.clear(rejected)
+            headers["Authorization"] = f"Bearer {get_access_token()}"
+            resp = send()
+
+        if resp.status_code in statuses:
+            return resp
+
+        if (
+            attempt + 1 == config.AZURE_MAX_RETRIES
+            or not retry_policy.should_retry(resp)
+            or not retry_policy.take()
+        ):
+            break
+
+        logger.warning(f"Retry conneting to {url}")
+        time.sleep(retry_policy.delay(attempt, resp))
+
+    raise Exception(error)
+
 
 def post_request(url: str, params: dict[str, str | None]) -> requests.Response:
     try:
-        return requests.post(url, params, timeout=10)
+        return session.post(url, params, timeout=10)
     except Timeout:
         logger.warning(f"Timeout trying to reach: {url}")
         return requests.Response()
@@ -35,7 +225,7 @@ def get_request(
     url: str, params: dict[str, str], headers: dict[str, str]
 ) -> requests.Response:
     try:
-        return requests.get(url, params=params, headers=headers, timeout=10)
+        return session.get(url, params=params, headers=headers, timeout=10)
     except Timeout:
         logger.warning(f"Timeout trying to reach: {url}")
         return requests.Response()
@@ -44,13 +234,219 @@ def get_request(
         raise SystemExit(err)
 
 
+class ResponseCache:
+    """Keeps the content of responses in a directory between runs.
+
+    Responses are keyed by their url and parameters, such as the api-version.
+    Their ETag and Last-Modified headers are kept to revalidate them with a
+    conditional request. A response younger than the ttl is used without a
+    request. Without a directory, nothing is cached.
+    """
+
+    def __init__(self, path: str | None = None, ttl: float = 0):
+        """Initialize the response cache."""
+        self.path = path
+        self.ttl = ttl
+
+    def filename(self, url: str, params: dict[str, str]) -> str:
+        """Get the file of a response."""
+        key = json.dumps([url, params], sort_keys=True)
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(str(self.path), f"{digest}.json")
+
+    def load(self, url: str, params: dict[str, str]) -> dict[str, Any] | None:
+        """Load a cached response, if there is one."""
+        if not self.path:
+            return None
+        try:
+            with open(self.filename(url, params)) as f:
+                entry: dict[str, Any] = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url or entry.get("params") != params:
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict[str, Any]) -> bool:
+        """Check whether a cached response can be used without a request."""
+        return time.time() - float(entry.get("stored_on", 0)) < self.ttl
+
+    def headers(self, entry: dict[str, Any] | None) -> dict[str, str]:
+        """Get the headers of a conditional request for a cached response."""
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def save(self, entry: dict[str, Any]) -> None:
+        """Save a response, the time it is stored on is updated."""
+        if not self.path:
+            return
+        entry["stored_on"] = time.time()
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.path, suffix=".tmp", delete=False
+            ) as f:
+                json.dump(entry, f)
+            os.replace(f.name, self.filename(entry["url"], entry["params"]))
+        except OSError as err:
+            logger.warning(f"Unable to cache the response of {entry['url']}: {err}")
+
+
+response_cache = ResponseCache(config.AZURE_HTTP_CACHE, config.AZURE_HTTP_CACHE_TTL)
+
+
+def get_listing(
+    url: str, params: dict[str, str], headers: dict[str, str], error: str
+) -> Any:
+    """Get a listing of the image catalog through the response cache.
+
+    Args:
+        url: Url of the listing
+        params: Parameters of the request
+        headers: Headers of the request
+        error: Message of the exception if the request fails
+
+    Returns:
+        JSON content of the listing.
+    """
+    entry = response_cache.load(url, params)
+    if entry is not None and response_cache.is_fresh(entry):
+        return entry["content"]
+
+    conditional = dict(headers, **response_cache.headers(entry))
+    statuses = (200,) if entry is None else (200, 304)
+    resp = send_request(
+        lambda: get_request(url, params, conditional), url, error, statuses, conditional
+    )
+
+    if entry is not None and resp.status_code == 304:
+        response_cache.save(entry)
+        return entry["content"]
+
+    content = resp.json()
+    response_cache.save(
+        {
+            "url": url,
+            "params": params,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content": content,
+        }
+    )
+    return content
+
+
+class TokenProvider:
+    """Caches the access token until shortly before it expires.
+
+    The token is shared by all callers of a process. If a cache file is set,
+    the token is also kept there for the following runs. The file is only
+    readable by its owner.
+    """
+
+    def __init__(self, cache_path: str | None = None, margin: float = 0):
+        """Initialize the token provider."""
+        self.cache_path = cache_path
+        self.margin = margin
+        self.token: str | None = None
+        self.expires_on = 0.0
+        self.lock = threading.Lock()
+
+    def get(self) -> str:
+        """Get a valid access token, authenticate if there is none."""
+        with self.lock:
+            if not self.is_valid():
+                self.load()
+            if not self.is_valid():
+                self.token, self.expires_on = request_access_token()
+                self.save()
+            return str(self.token)
+
+    def clear(self, token: str | None = None) -> None:
+        """Forget the cached token and remove the cache file.
+
+        Args:
+            token: Token that was rejected, a newer token is kept.
+        """
+        with self.lock:
+            if token is not None and self.token is not None and self.token != token:
+                return
+            self.token = None
+            self.expires_on = 0.0
+            if self.cache_path:
+                try:
+                    os.remove(self.cache_path)
+                except OSError:
+                    pass
+
+    def is_valid(self) -> bool:
+        """Check whether the token is valid for longer than the margin."""
+        return self.token is not None and time.time() < self.expires_on - self.margin
+
+    def key(self) -> str:
+        """Get the account the token belongs to."""
+        return f"{config.AZURE_TENANT_ID}:{config.AZURE_CLIENT_ID}"
+
+    def load(self) -> None:
+        """Load the token from the cache file."""
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            if data["key"] == self.key():
+                self.token = str(data["access_token"])
+                self.expires_on = float(data["expires_on"])
+        except (OSError, ValueError, TypeError, KeyError):
+            return
+
+    def save(self) -> None:
+        """Save the token to the cache file."""
+        if not self.cache_path or self.expires_on <= 0:
+            return
+        data = {
+            "key": self.key(),
+            "access_token": self.token,
+            "expires_on": self.expires_on,
+        }
+        path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(path, self.cache_path)
+        except OSError as err:
+            logger.warning(f"Unable to cache the access token: {err}")
+
+
+token_provider = TokenProvider(
+    config.AZURE_TOKEN_CACHE, config.AZURE_TOKEN_REFRESH_MARGIN
+)
+
+
 def get_access_token() -> str:
-    """Authenticate with Azure and return the access token to use with API
-    requests.
+    """Return the access token to use with API requests.
+
+    The token is cached by the token provider and reused until shortly
+    before it expires.
 
     Returns:
         Access token as a string.
     """
+    return token_provider.get()
+
+
+def request_access_token() -> tuple[str, float]:
+    """Authenticate with Azure and return a new access token.
+
+    Returns:
+        Access token as a string and the time it expires on, in seconds since
+        the epoch. The time is 0 if Azure didn't send it.
+    """
     params = {
         "grant_type": "client_credentials",
         "client_id": config.AZURE_CLIENT_ID,
@@ -59,17 +455,18 @@ def get_access_token() -> str:
     }
     url = f"https://login.microsoftonline.com/{config.AZURE_TENANT_ID}/oauth2/token"
 
-    for _i in range(config.AZURE_MAX_RETRIES):
-        resp = post_request(url, params)
-
-        if resp.status_code == 200:
-            return str(resp.json().get("access_token", None))
+    # If no auth token can be obtained, throw an exception.
+    data = call_api(lambda: post_request(url, params), url, "Unable to authenticate.")
 
-        logger.warning(f"Retry conneting to {url}")
-        time.sleep(config.AZURE_REQUEST_FAILURE_TIMEOUT)
+    try:
+        if "expires_on" in data:
+            expires_on = float(data["expires_on"])
+        else:
+            expires_on = time.time() + float(data["expires_in"])
+    except (KeyError, TypeError, ValueError):
+        expires_on = 0.0
 
-    # If no auth token can be obtained, throw an exception.
-    raise Exception("Unable to authenticate.")
+    return str(data.get("access_token", None)), expires_on
 
 
 def get_locations(access_token: str) -> list[str]:
@@ -83,19 +480,16 @@ def get_locations(access_token: str) -> list[str]:
     headers = {"Authorization": f"Bearer {access_token}"}
     params = {"api-version": "2020-01-01"}
     url = (
-        f"https://management.azure.com/subscriptions/{config.AZURE_SUBSCRIPTION_ID}"
+        f"{config.AZURE_MANAGEMENT_URL}/subscriptions/{config.AZURE_SUBSCRIPTION_ID}"
         "/locations"
     )
-    resp = None
-    for _i in range(config.AZURE_MAX_RETRIES):
-        resp = get_request(url, params, headers)
-        if resp.status_code == 200:
-            return sorted([x["name"] for x in resp.json()["value"]])
-
-        logger.warning(f"Retry conneting to {url}")
-        time.sleep(config.AZURE_REQUEST_FAILURE_TIMEOUT)
-
-    raise Exception("Unable to retrieve locations.")
+    data = call_api(
+        lambda: get_request(url, params, headers),
+        url,
+        "Unable to retrieve locations.",
+        headers,
+    )
+    return sorted([x["name"] for x in data["value"]])
 
 
 def get_publishers(access_token: str, location: str) -> list[str]:
@@ -113,19 +507,11 @@ def get_publishers(access_token: str, location: str) -> list[str]:
     headers = {"Authorization": f"Bearer {access_token}"}
     params = {"api-version": "2022-08-01"}
     url = (
-        f"https://management.azure.com/subscriptions/{config.AZURE_SUBSCRIPTION_ID}/"
+        f"{config.AZURE_MANAGEMENT_URL}/subscriptions/{config.AZURE_SUBSCRIPTION_ID}/"
         f"providers/Microsoft.Compute/locations/{location}/publishers"
     )
-    resp = None
-    for _i in range(config.AZURE_MAX_RETRIES):
-        resp = get_request(url, params, headers)
-        if resp.status_code == 200:
-            return sorted([x["name"] for x in resp.json()])
-
-        logger.warning(f"Retry conneting to {url}")
-        time.sleep(config.AZURE_REQUEST_FAILURE_TIMEOUT)
-
-    raise Exception("Unable to retrieve publishers.")
+    data = get_listing(url, params, headers, "Unable to retrieve publishers.")
+    return sorted([x["name"] for x in data])
 
 
 def get_offers(access_token: str, location: str, publisher: str) -> list[str]:
@@ -144,20 +530,12 @@ def get_offers(access_token: str, location: str, publisher: str) -> list[str]:
     headers = {"Authorization": f"Bearer {access_token}"}
     params = {"api-version": "2022-08-01"}
     url = (
-        f"https://management.azure.com/subscriptions/{config.AZURE_SUBSCRIPTION_ID}/"
+        f"{config.AZURE_MANAGEMENT_URL}/subscriptions/{config.AZURE_SUBSCRIPTION_ID}/"
         f"providers/Microsoft.Compute/locations/{location}/publishers/"
         f"{publisher}/artifacttypes/vmimage/offers"
     )
-    resp = None
-    for _i in range(config.AZURE_MAX_RETRIES):
-        resp = get_request(url, params, headers)
-        if resp.status_code == 200:
-            return sorted([x["name"] for x in resp.json()])
-
-        logger.warning(f"Retry conneting to {url}")
-        time.sleep(config.AZURE_REQUEST_FAILURE_TIMEOUT)
-
-    raise Exception("Unable to retrieve offers.")
+    data = get_listing(url, params, headers, "Unable to retrieve offers.")
+    return sorted([x["name"] for x in data])
 
 
 def get_skus(access_token: str, location: str, publisher: str, offer: str) -> list[str]:
@@ -177,20 +555,12 @@ def get_skus(access_token: str, location: str, publisher: str, offer: str) -> li
     headers = {"Authorization": f"Bearer {access_token}"}
     params = {"api-version": "2022-08-01"}
     url = (
-        f"https://management.azure.com/subscriptions/{config.AZURE_SUBSCRIPTION_ID}/"
+        f"{config.AZURE_MANAGEMENT_URL}/subscriptions/{config.AZURE_SUBSCRIPTION_ID}/"
         f"providers/Microsoft.Compute/locations/{location}/publishers/"
         f"{publisher}/artifacttypes/vmimage/offers/{offer}/skus"
     )
-    resp = None
-    for _i in range(config.AZURE_MAX_RETRIES):
-        resp = get_request(url, params, headers)
-        if resp.status_code == 200:
-            return sorted([x["name"] for x in resp.json()])
-
-        logger.warning(f"Retry conneting to {url}")
-        time.sleep(config.AZURE_REQUEST_FAILURE_TIMEOUT)
-
-    raise Exception("Unable to retrieve skus.")
+    data = get_listing(url, params, headers, "Unable to retrieve skus.")
+    return sorted([x["name"] for x in data])
 
 
 def get_image_versions(
@@ -219,26 +589,18 @@ def get_image_versions(
     headers = {"Authorization": f"Bearer {access_token}"}
     params = {"api-version": "2022-08-01"}
     url = (
-        f"https://management.azure.com/subscriptions/{config.AZURE_SUBSCRIPTION_ID}/"
+        f"{config.AZURE_MANAGEMENT_URL}/subscriptions/{config.AZURE_SUBSCRIPTION_ID}/"
         f"providers/Microsoft.Compute/locations/{location}/publishers/"
         f"{publisher}/artifacttypes/vmimage/offers/{offer}/skus/{sku}/versions"
     )
-    resp = None
-    for _i in range(config.AZURE_MAX_RETRIES):
-        resp = get_request(url, params, headers)
-        if resp.status_code == 200:
-            images = [x["name"] for x in resp.json()]
+    data = get_listing(url, params, headers, "Unable to retrieve image versions.")
+    images = [x["name"] for x in data]
 
-            # Return only the last image if requested.
-            if latest:
-                return [images[-1]]
+    # Return only the last image if requested.
+    if latest:
+        return [images[-1]]
 
-            return images
-
-        logger.warning(f"Retry conneting to {url}")
-        time.sleep(config.AZURE_REQUEST_FAILURE_TIMEOUT)
-
-    raise Exception("Unable to retrieve image versions.")
+    return images
 
 
 def get_image_details(
@@ -261,125 +623,89 @@ def get_image_details(
     params = {"api-version": "2022-08-01"}
 
     url = (
-        f"https://management.azure.com/subscriptions/{config.AZURE_SUBSCRIPTION_ID}/"
+        f"{config.AZURE_MANAGEMENT_URL}/subscriptions/{config.AZURE_SUBSCRIPTION_ID}/"
         f"providers/Microsoft.Compute/locations/{location}/publishers/"
         f"{publisher}/artifacttypes/vmimage/offers/{offer}/skus/{sku}/"
         f"versions/{version}"
     )
 
-    resp = None
-    for _i in range(config.AZURE_MAX_RETRIES):
-        resp = get_request(url, params, headers)
-        if resp.status_code == 200:
-            data: dict[str, dict[str, str]] = resp.json()
-            return data
-
-        logger.warning(f"Retry conneting to {url}")
-        time.sleep(config.AZURE_REQUEST_FAILURE_TIMEOUT)
-
-    raise Exception("Unable to retrieve image details.")
+    data = call_api(
+        lambda: get_request(url, params, headers),
+        url,
+        "Unable to retrieve image details.",
+        headers,
+    )
+    details: dict[str, dict[str, str]] = data
+    return details
 
 
 def get_images() -> list[dict[str, str]]:
     """Get a list of Azure RHEL images.
 
+    The image versions of all skus and the details of all image versions are
+    requested concurrently, with at most AZURE_MAX_WORKERS requests at a
+    time. The images are listed in the order of the image tree.
+
     Returns:
         List of dictionaries matching `az vm image list` output.
     """
     results = []
+    retry_policy.reset()
     access_token = get_access_token()
+    location = config.AZURE_DEFAULT_LOCATION
+
+    skus = []
     for entry in config.AZURE_RHEL_IMAGE_TREE:
         for publisher, offers in entry.items():
-            for offer, skus in offers.items():
-                for sku, version in skus.items():
+            for offer, sku_versions in offers.items():
+                for sku, version in sku_versions.items():
                     # Are we looking for the latest image or all images?
-                    latest = True
-                    if version != "latest":
-                        latest = False
-                    # Get the image versions that match the pub/offer/sku combination.
-                    image_versions = get_image_versions(
-                        access_token,
-                        config.AZURE_DEFAULT_LOCATION,
-                        publisher,
-                        offer,
-                        sku,
-                        latest,
-                    )
-
-                    # Loop through the image versions and add on this image version to
-                    # the list in Azure's `az vm image list` format.
-                    for image_version in image_versions:
-                        image_details = get_image_details(
-                            access_token,
-                            config.AZURE_DEFAULT_LOCATION,
-                            publisher,
-                            offer,
-                            sku,
-                            image_version,
-                        )
-                        hypervgen = image_details["properties"].get(
-                            "hyperVGeneration", "unknown"
-                        )
-                        arch = image_details["properties"].get(
-                            "architecture", "unknown"
-                        )
-
-                        result = {
-                            "architecture": arch,
-                            "hyperVGeneration": hypervgen,
-                            "offer": offer,
-                            "publisher": publisher,
-                            "sku": sku,
-                            "urn": f"{publisher}:{offer}:{sku}:{image_version}",
-                            "version": image_version,
-                        }
-
-                        results.append(result)
+                    skus.append((publisher, offer, sku, version == "latest"))
+
+    workers = max(1, min(config.AZURE_MAX_WORKERS, len(skus)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Get the image versions that match the pub/offer/sku combinations.
+        versions = [
+            executor.submit(get_image_versions, access_token, location, *x)
+            for x in skus
+        ]
+
+        # Request the details of the image versions of a sku once they are known.
+        details: list[tuple[str, str, str, str, Future]] = []
+        for (publisher, offer, sku, _latest), image_versions in zip(skus, versions):
+            for image_version in image_versions.result():
+                image_details = executor.submit(
+                    get_image_details,
+                    access_token,
+                    location,
+                    publisher,
+                    offer,
+                    sku,
+                    image_version,
+                )
+                details.append((publisher, offer, sku, image_version, image_details))
+
+        # Add on the image versions to the list in Azure's `az vm image list` format.
+        for publisher, offer, sku, image_version, image_details in details:
+            properties = image_details.result()["properties"]
+            hypervgen = properties.get("hyperVGeneration", "unknown")
+            arch = properties.get("architecture", "unknown")
+
+            result = {
+                "architecture": arch,
+                "hyperVGeneration": hypervgen,
+                "offer": offer,
+                "publisher": publisher,
+                "sku": sku,
+                "urn": f"{publisher}:{offer}:{sku}:{image_version}",
+                "version": image_version,
+            }
+
+            results.append(result)
 
     return results
 
 
-def parse_image_version(image_version: str) -> dict[str, str]:
-    """Parse an AWS image name and return extra data about the image.
-
-    Regex101: https://regex101.com/r/yHB9jJ/1
-
-    Args:
-        image_version: String containing the image version, such as:
-                    7.4.2021051102 or 9.0.0.2022053014
-
-    Returns:
-        Dictionary with additional information about the image.
-    """
-    # See Regex101 link above to tinker with this regex. Each group is named to make
-    # it easier to handle parsed data. Explanation of names:
-    #
-    #     version = RHEL version (such as 9.0)
-    #     date = date image was produced
-    #
-    aws_image_name_regex = (
-        r"(?P<version>[\d]+\.[\d]+(?:\.[\d]+)?)\.(?P<date>\d{4}\d{2}\d{2})"
-    )
-    matches = re.match(aws_image_name_regex, image_version, re.IGNORECASE)
-    if matches:
-        return matches.groupdict()
-
-    return {}
-
-
-def convert_date(date: str) -> str:
-    """Convert timestamp to date string This fallback is necessary as Azure
-    timestamps are inconsistent and can either follow yyyymmdd or yyyyddmm.
-
-    Returns:
-        Date as string following the structure "%Y-%m-%d"
-    """
-    try:
-        return datetime.strptime(date, "%Y%m%d").strftime("%Y-%m-%d")
-    except:
-        return datetime.strptime(date, "%Y%d%m").strftime("%Y-%m-%d")
-
-
 def format_all_images() -> object:
     """Retrieve all Azure images and return a simplified data representation.
 
@@ -394,36 +720,3 @@ def format_all_images() -> object:
         formatted_images.append(format_image(image))
 
     return {"images": {"azure": formatted_images}}
-
-
-def format_image(image: dict[str, str]) -> dict[str, str]:
-    """Compile a dictionary of important image information.
-
-    Args:
-        images: A dictionary containing metadata about the image.
-
-    Returns:
-        JSON like structure containing streamlined image
-        information.
-    """
-    additional_information = parse_image_version(image["version"])
-
-    arch = image["architecture"]
-    image_id = image["urn"]
-    virt_type = image["hyperVGeneration"]
-    sku = image["sku"]
-    offer = image["offer"]
-
-    date = convert_date(additional_information["date"])
-    version = additional_information["version"]
-
-    name = f"{offer} {sku} {arch}"
-
-    return {
-        "name": name,
-        "arch": arch,
-        "version": version,
-        "imageId": image_id,
-        "date": date,
-        "virt": virt_type,
-    }
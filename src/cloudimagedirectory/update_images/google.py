@@ -1,13 +1,18 @@
 """Update images from public cloud APIs."""
 from __future__ import annotations
 
-import re
-
 from typing import Any
 
 from google.cloud import compute_v1
 
 from cloudimagedirectory import config
+from cloudimagedirectory.format import format_google
+
+
+# NOTE: The image names are parsed by the transformer as well, both share
+# the implementation and its caches.
+parse_image_name = format_google.parse_image_name_rhel
+format_image = format_google.image_rhel
 
 
 def get_images() -> list[dict[str, str]]:
@@ -68,30 +73,6 @@ def normalize_google_images(image_list: list[Any]) -> list[dict[str, str]]:
     return normalized_images
 
 
-def parse_image_name(image_name: str) -> dict[str, str]:
-    """Parse an google image name and return version string.
-
-    Regex101: https://regex101.com/r/9QCWIJ/1
-
-    Args:
-        image_name: String containing the image name, such as:
-                    rhel-7-9-sap-v20220719
-
-    Returns:
-        Dictionary with additional information about the image.
-    """
-    google_image_name_regex = (
-        r"(?P<product>\w*)-(?P<version>[\d]+(?:\-[\d]){0,3})-?"
-        r"(?P<extprod>\w*)?-v(?P<date>\d{4}\d{2}\d{2})"
-    )
-
-    matches = re.match(google_image_name_regex, image_name, re.IGNORECASE)
-    if matches:
-        return matches.groupdict()
-
-    return {}
-
-
 def format_all_images() -> object:
     """Retrieve all google images and return a simplified data representation.
 
@@ -107,46 +88,3 @@ def format_all_images() -> object:
         formatted_images.append(format_image(image))
 
     return {"images": {"google": formatted_images}}
-
-
-def format_image(image: dict[str, str]) -> dict[str, str]:
-    """Compile a dictionary of important image information.
-
-    Args:
-        images: A dictionary containing metadata about the image.
-
-    Returns:
-        JSON like structure containing streamlined image
-        information.
-    """
-    additional_information = parse_image_name(image["name"])
-
-    arch = image["architecture"]
-    image_id = image["name"]
-    date = image["creation_timestamp"]
-    extprod = additional_information["extprod"]
-    version = additional_information["version"].replace("-", ".")
-
-    name_parts = ["RHEL", version, extprod]
-
-    # This is necessary to avoid creating names like "RHEL 9 arm64 arm64"
-    # as the naming conventions for Google images are inconsistent.
-    # e.g.
-    # rhel-9-arm64-v20221206
-    # rhel-7-6-sap-v20221102
-    if extprod.lower() != arch.lower():
-        name_parts.append(arch)
-
-    name = " ".join([x for x in name_parts if x != ""])
-
-    selflink = "https://console.cloud.google.com/compute/imagesDetail/"
-    selflink += f"projects/rhel-cloud/global/images/{image_id}"
-
-    return {
-        "name": name,
-        "arch": arch,
-        "version": version,
-        "imageId": image_id,
-        "date": date,
-        "selflink": selflink,
-    }
@@ -6,6 +6,7 @@ import json
 import pytest
 
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 
 from cloudimagedirectory.api import server
 from cloudimagedirectory.api.routes.health import health_blueprint
@@ -168,3 +169,12 @@ def test_request_health(client):
 def test_request_health_with_corrupt_data(corrupted_client):
     response = corrupted_client.get("/api/health")
     assert response.status_code == 500
+
+
+def test_response_is_identical_to_flask_default(app, client):
+    """Verify that the fast JSON provider writes the same responses as Flask."""
+    response = client.get("/api/aws")
+
+    with app.app_context():
+        default = DefaultJSONProvider(app).response(json.loads(response.data))
+    assert response.data == default.data
@@ -0,0 +1,142 @@
+import io
+import json
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+from cloudimagedirectory.connection import connection
+
+
+def test_put_content_skip_unchanged(tmp_path):
+    """Verify that unchanged files are not rewritten."""
+    filename = str(tmp_path / "aws" / "region-1" / "rhel-1")
+    conn = connection.ConnectionFS(str(tmp_path), [], skip_unchanged=True)
+
+    assert conn.put_content(connection.DataEntry(filename, {"date": "2023-01-01"}))
+    os.utime(filename, ns=(0, 0))
+
+    assert not conn.put_content(connection.DataEntry(filename, {"date": "2023-01-01"}))
+    assert os.stat(filename).st_mtime_ns == 0
+
+    assert conn.put_content(connection.DataEntry(filename, {"date": "2023-01-02"}))
+    assert os.stat(filename).st_mtime_ns != 0
+
+
+def test_stream_json_array():
+    """Verify that streamed items match the parsed document."""
+    document = json.dumps(
+        [
+            {"name": "rhel-9", "tags": ["a]", "b,"], "size": 10},
+            12345678901234567890,
+            -1.5e10,
+            [[], {}],
+            None,
+            True,
+            "]",
+        ]
+    )
+    for chunk_size in range(1, len(document) + 1):
+        items = connection.stream_json_array(io.StringIO(document), chunk_size)
+        assert list(items) == json.loads(document)
+
+    assert list(connection.stream_json_array(io.StringIO(""))) == []
+    assert list(connection.stream_json_array(io.StringIO(" [ ] "))) == []
+
+    for invalid in ["[1 2]", "[1,]", "[{}", "[1.]"]:
+        with pytest.raises(json.JSONDecodeError):
+            list(connection.stream_json_array(io.StringIO(invalid), 2))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 64])
+def test_stream_json_array_trailing_data(chunk_size):
+    """Verify that only whitespace may follow the streamed array."""
+    document = "[1] \n\t "
+    items = connection.stream_json_array(io.StringIO(document), chunk_size)
+    assert list(items) == [1]
+
+    for invalid in ["[1]x", "[1]]", "[1]   [2]", "[] 0"]:
+        with pytest.raises(json.JSONDecodeError):
+            json.loads(invalid)
+        with pytest.raises(json.JSONDecodeError):
+            list(connection.stream_json_array(io.StringIO(invalid), chunk_size))
+
+
+def test_get_content_stream():
+    """Verify that a streamed raw file yields the same images."""
+    filename = "tests/transformer/testdata/input/raw/google/all.json"
+    data = connection.DataEntry(filename, None)
+
+    loaded = connection.ConnectionFS("", []).get_content(data)
+    streamed = connection.ConnectionFS("", [], stream=True).get_content(data)
+
+    assert not isinstance(streamed.content, list)
+    assert list(streamed.content) == loaded.content
+
+
+def test_data_entry_lazy_content(tmp_path):
+    """Verify that listed entries load their content on first access."""
+    (tmp_path / "raw" / "aws").mkdir(parents=True)
+    (tmp_path / "raw" / "aws" / "region-1.json").write_text('[{"a": 1}]')
+    conn = connection.ConnectionFS(str(tmp_path), [])
+
+    entry = conn.get_filenames()[0]
+    assert not entry.is_loaded()
+    assert entry.content == [{"a": 1}]
+    assert entry.is_loaded()
+
+    entry.evict()
+    assert not entry.is_loaded()
+    assert entry.content == [{"a": 1}]
+
+    restored = pickle.loads(pickle.dumps(entry))
+    assert restored.content == [{"a": 1}]
+
+    entry = connection.DataEntry("aws/region-1/rhel-1", {"date": "2023-01-01"})
+    entry.evict()
+    assert entry.content is None
+    assert not hasattr(entry, "__dict__")
+
+
+@pytest.mark.parametrize(
+    "filename, kind, provider, region, slug",
+    [
+        ("/data/raw/aws/eu-west-1.json", "raw", "aws", "eu-west-1", None),
+        ("s3://bucket/raw/google/global.json", "raw", "google", "global", None),
+        ("azure/eastus/rhel_9", "image", "azure", "eastus", "rhel_9"),
+        ("google/rhel_9", "image", "google", None, "rhel_9"),
+        ("idx/list/sort-by-date-aws/0", "idx", None, None, None),
+        ("/srv/aws/raw/google/all.json", "raw", "google", "all", None),
+        ("/srv/raw/aws/raw/azure/eastus.json", "raw", "azure", "eastus", None),
+        ("/srv/raw/other/region.json", "raw", None, "region", None),
+    ],
+)
+def test_data_entry_classification(filename, kind, provider, region, slug):
+    """Verify that the filename is parsed when it is set."""
+    entry = connection.DataEntry(filename, {})
+    assert (entry.kind, entry.provider, entry.region, entry.slug) == (
+        kind,
+        provider,
+        region,
+        slug,
+    )
+    assert entry.is_raw() == (kind == "raw")
+
+
+def test_data_entry_rename():
+    """Verify that the classification follows a renamed entry."""
+    entry = connection.DataEntry("aws/region-1/rhel-1", {})
+    entry.filename = "/data/raw/azure/region-2.json"
+    assert (entry.kind, entry.provider, entry.region) == ("raw", "azure", "region-2")
+
+
+def test_filesystem_connection_without_boto3(tmp_path):
+    """Verify that filesystem connections don't import boto3."""
+    code = (
+        "import sys; from cloudimagedirectory.connection import connection;"
+        f" connection.open_connection({str(tmp_path)!r}, []).get_filenames();"
+        " sys.exit('boto3' in sys.modules)"
+    )
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
@@ -0,0 +1,119 @@
+import boto3
+import moto
+import pytest
+
+from click.testing import CliRunner
+
+from cloudimagedirectory import transformer
+from cloudimagedirectory.connection import connection
+from cloudimagedirectory.connection import writer
+
+
+@pytest.fixture()
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket="images")
+        yield client
+
+
+def test_get_filenames_and_content(s3_client, mocker):
+    """Verify that objects are listed over all pages and parsed."""
+    for i in range(5):
+        s3_client.put_object(
+            Bucket="images", Key=f"raw/aws/region-{i}.json", Body=b'[{"a": 1}]'
+        )
+    s3_client.put_object(Bucket="images", Key="raw/aws/empty.json", Body=b"")
+    s3_client.put_object(Bucket="images", Key="raw/readme.txt", Body=b"")
+    s3_client.put_object(Bucket="images", Key="other/aws.json", Body=b"[]")
+
+    conn = connection.ConnectionS3("s3://images/raw/", [])
+    conn.page_size = 2
+    conn.connect()
+    spy = mocker.spy(conn.client, "list_objects_v2")
+    filenames = sorted(x.filename for x in conn.get_filenames())
+    assert filenames == ["s3://images/raw/aws/empty.json"] + [
+        f"s3://images/raw/aws/region-{i}.json" for i in range(5)
+    ]
+    assert spy.call_count == 4
+
+    data = conn.get_content(connection.DataEntry(filenames[1], None))
+    assert data.content == [{"a": 1}]
+    assert data.is_raw()
+    assert conn.get_content(connection.DataEntry(filenames[0], None)).content == {}
+    assert conn.get_stat(data)[0] == len(b'[{"a": 1}]')
+    assert conn.get_hash(data).startswith('"')
+
+
+def test_put_content_skip_unchanged(s3_client):
+    """Verify that objects with the same ETag are not uploaded again."""
+    conn = connection.ConnectionS3("s3://images/v1", [], skip_unchanged=True, workers=4)
+    conn.connect()
+    entries = [
+        connection.DataEntry(f"s3://images/v1/aws/{i}", {"name": str(i)})
+        for i in range(10)
+    ]
+    with writer.BatchWriter(conn, 4) as batch_writer:
+        for entry in entries:
+            batch_writer.put(entry)
+    assert batch_writer.written == 10
+
+    body = s3_client.get_object(Bucket="images", Key="v1/aws/3")["Body"].read()
+    assert body == b'{"name": "3"}\n'
+
+    second = connection.ConnectionS3("s3://images/v1", [], skip_unchanged=True)
+    second.connect()
+    entries[3].content = {"name": "changed"}
+    assert [second.put_content(x) for x in entries[2:5]] == [False, True, False]
+
+
+def test_put_content_lists_once(s3_client, mocker):
+    """Verify that concurrent writers list the destination only once."""
+    conn = connection.ConnectionS3("s3://images/v1", [], skip_unchanged=True, workers=8)
+    conn.connect()
+    spy = mocker.spy(conn.client, "list_objects_v2")
+    with writer.BatchWriter(conn, 8) as batch_writer:
+        for i in range(32):
+            batch_writer.put(
+                connection.DataEntry(f"s3://images/v1/aws/{i}", {"name": str(i)})
+            )
+    assert batch_writer.written == 32
+    assert spy.call_count == 1
+
+
+def test_not_connected():
+    """Verify that a connection has to be connected before it is used."""
+    conn = connection.ConnectionS3("s3://images", [])
+    with pytest.raises(Exception) as err:
+        conn.get_filenames()
+    assert err.value is connection.exception_not_connected
+
+    with pytest.raises(ValueError):
+        connection.split_s3_url("/tmp/images")
+
+
+def test_transformer_destination_trailing_slash(s3_client):
+    """Verify that a trailing slash of the destination isn't part of the keys."""
+    result = CliRunner().invoke(
+        transformer.run,
+        [
+            "-f",
+            "tests/transformer/testdata/input/raw/aws/af-south-1.json",
+            "-op",
+            ".",
+            "-dp",
+            "s3://images/data/",
+            "-v",
+            "v1",
+            "--filter.until",
+            "none",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+
+    keys = [x["Key"] for x in s3_client.list_objects_v2(Bucket="images")["Contents"]]
+    assert "data/v1/aws/af-south-1/rhel_6.10_hvm_x86_64_hourly2" in keys
+    assert all(x.startswith("data/v1/") and "//" not in x for x in keys)
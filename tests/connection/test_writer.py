@@ -0,0 +1,31 @@
+import json
+import os
+
+from cloudimagedirectory.connection import connection
+from cloudimagedirectory.connection import writer
+
+
+def test_batch_writer(tmp_path):
+    """Verify that batches are written completely and atomically."""
+    conn = connection.ConnectionFS(str(tmp_path), [], skip_unchanged=True)
+
+    with writer.BatchWriter(conn, workers=4, batch_size=3) as batch_writer:
+        for i in range(10):
+            batch_writer.put(
+                connection.DataEntry(str(tmp_path / f"region-{i % 2}" / f"{i}"), [i])
+            )
+        # NOTE: The last entry of a filename within a batch wins.
+        batch_writer.put(connection.DataEntry(str(tmp_path / "region-1" / "9"), [0]))
+
+    assert batch_writer.written == 10
+    assert batch_writer.skipped == 0
+    assert json.loads((tmp_path / "region-1" / "9").read_text()) == [0]
+    assert json.loads((tmp_path / "region-0" / "4").read_text()) == [4]
+    assert not [x for x in os.listdir(tmp_path / "region-0") if x.endswith(".tmp")]
+
+    with writer.BatchWriter(conn) as batch_writer:
+        batch_writer.put(connection.DataEntry(str(tmp_path / "region-0" / "0"), [0]))
+        batch_writer.put(connection.DataEntry(str(tmp_path / "region-0" / "2"), [3]))
+
+    assert batch_writer.written == 1
+    assert batch_writer.skipped == 1
@@ -1,3 +1,6 @@
+import subprocess
+import sys
+
 import pandas as pd
 
 from cloudimagedirectory.connection import connection
@@ -52,3 +55,44 @@ def test_filterImageByLatestUpdate():
     assert len(expected) == len(results)
     assert expected[0].content == results[0].content
     assert expected[1].content == results[1].content
+
+
+def test_filterImageByLatestUpdate_date_string():
+    """Test for filtering the images from a date string."""
+    data = [
+        connection.DataEntry("aws/region-1/rhel-1", {"date": "2023-04-04T00:00:01Z"}),
+        connection.DataEntry("aws/region-1/rhel-2", {"date": "2023-04-04"}),
+    ]
+    results = filter.FilterImageByLatestUpdate("2023-04-04")(data)
+
+    assert [x.filename for x in results] == ["aws/region-1/rhel-1"]
+
+
+def test_transformer_without_pandas():
+    """Verify that the transformer doesn't import pandas for ISO dates."""
+    code = (
+        "import sys; from cloudimagedirectory import transformer;"
+        " transformer.parse_date('2023-04-04'); sys.exit('pandas' in sys.modules)"
+    )
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+
+def test_filterImageByFilenames():
+    """Test for filtering the images by any of several words."""
+    data = [
+        connection.DataEntry("aws/region-1/rhel-9-TEST", {}),
+        connection.DataEntry("aws/region-1/rhel-9-beta", {}),
+        connection.DataEntry("aws/region-1/rhel-9.2", {}),
+        connection.DataEntry("aws/region-1/rhel-9-2", {}),
+    ]
+
+    results = filter.FilterImageByFilenames(["test", "Beta", "9.", ""])(data)
+    assert [x.filename for x in results] == ["aws/region-1/rhel-9-2"]
+
+    words = ["test", "Beta", "9.", "rhel-9-beta", "beta"]
+    assert (
+        filter.FilterImageByFilenames(words).name
+        == "filenames rhel-9-beta,beta,test,9."
+    )
+
+    assert filter.FilterImageByFilenames([""])(data) == data
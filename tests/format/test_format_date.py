@@ -0,0 +1,32 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from cloudimagedirectory.format import format_date
+
+
+@pytest.mark.parametrize(
+    "date, expected",
+    [
+        ("2022-11-02", "2022-11-02T00:00:00.000000000"),
+        ("2022-9-6", "2022-09-06T00:00:00.000000000"),
+        ("2022-09-06T13:00:02.000Z", "2022-09-06T13:00:02.000000000"),
+        ("2022-11-02T12:34:56.789-07:00", "2022-11-02T12:34:56.789000000"),
+        (pd.to_datetime("2023-04-04"), "2023-04-04T00:00:00.000000000"),
+        (
+            datetime.datetime(2021, 1, 2, 3, 4, 5, 6),
+            "2021-01-02T03:04:05.000006000",
+        ),
+    ],
+)
+def test_date_key(date, expected):
+    """Verify that dates are normalized into a fixed width key."""
+    assert format_date.date_key(date) == expected
+
+
+@pytest.mark.parametrize("date", ["", "2022-13-01", "20221102", "yesterday"])
+def test_date_key_invalid(date):
+    """Verify that invalid dates are rejected."""
+    with pytest.raises(ValueError):
+        format_date.date_key(date)
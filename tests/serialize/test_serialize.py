@@ -0,0 +1,89 @@
+import datetime
+import json
+
+import pytest
+
+from cloudimagedirectory.serialize import serialize
+
+
+DATA = [
+    {
+        "name": "RHEL 9.1.0 x86_64 HVM",
+        "arch": "x86_64",
+        "version": "9.1.0",
+        "date": "2022-11-02",
+        "tags": [],
+        "nested": {"empty": {}, "list": [1, True, None, "\u001f"]},
+    },
+    {"name": "RHEL é ", "count": 10**20},
+    {"name": "delete \u007f"},
+    {"size": 1e16, "ratio": 0.1},
+    {2: "int key", 1: "other key"},
+]
+
+OPTIONS = [
+    {},
+    {"indent": 2},
+    {"indent": 2, "sort_keys": True},
+    {"separators": (",", ":")},
+    {"separators": (",", ":"), "sort_keys": True},
+    {"indent": 4},
+]
+
+
+@pytest.mark.parametrize("fast", [True, False])
+@pytest.mark.parametrize("options", OPTIONS)
+@pytest.mark.parametrize("data", DATA)
+def test_dumps_is_identical(monkeypatch, fast, options, data):
+    """Verify that both backends write the same JSON as the standard library."""
+    if not fast:
+        monkeypatch.setattr(serialize, "orjson", None)
+    elif serialize.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    assert serialize.dumps(data, **options) == json.dumps(data, **options)
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_dumps_default(monkeypatch, fast):
+    """Verify that unknown types are passed to the default function."""
+    if not fast:
+        monkeypatch.setattr(serialize, "orjson", None)
+    elif serialize.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    data = {"date": datetime.date(2022, 11, 2), "ratio": object()}
+
+    def default(obj):
+        if isinstance(obj, datetime.date):
+            return obj.isoformat()
+        return 0.5
+
+    options = {"separators": (",", ":"), "default": default}
+    assert serialize.dumps(data, **options) == json.dumps(data, **options)
+
+    with pytest.raises(TypeError):
+        serialize.dumps(data, separators=(",", ":"))
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_loads(monkeypatch, fast):
+    """Verify that both backends parse what the standard library parses."""
+    if not fast:
+        monkeypatch.setattr(serialize, "orjson", None)
+        assert serialize.backend() == "json"
+
+    assert serialize.loads(b'[{"a": 1}]') == [{"a": 1}]
+    assert serialize.loads('{"a": "é"}') == {"a": "é"}
+    assert serialize.loads("[NaN, 100000000000000000000]")[1] == 10**20
+
+    result = serialize.loads(b'{"a": 18446744073709551616}')["a"]
+    assert type(result) is int
+    assert result == 2**64
+
+    result = serialize.loads("[100000000000000000001, 0.5]")
+    assert result == [10**20 + 1, 0.5]
+    assert type(result[0]) is int
+
+    with pytest.raises(json.JSONDecodeError):
+        serialize.loads("[1,]")
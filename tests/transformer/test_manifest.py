@@ -0,0 +1,175 @@
+import shutil
+
+from click.testing import CliRunner
+
+from cloudimagedirectory import transformer
+from cloudimagedirectory.connection import connection
+from cloudimagedirectory.transform import manifest
+from cloudimagedirectory.transform import transform
+
+
+TRANSFORMERS = [
+    transform.TransformerAWS,
+    transform.TransformerAZURE,
+    transform.TransformerGoogle,
+]
+
+
+def run_pipeline(src_conn, run_manifest):
+    pipeline = transform.Pipeline(
+        src_conn,
+        TRANSFORMERS,
+        [],
+        [transform.TransformerIdxListImageLatest],
+        manifest=run_manifest,
+    )
+    return pipeline.run(sorted(src_conn.get_filenames(), key=lambda x: x.filename))
+
+
+def test_manifest_skips_unchanged_raw_files(tmp_path, mocker):
+    """Verify that unchanged raw files are restored from the manifest."""
+    shutil.copytree("tests/transformer/testdata/input/raw", tmp_path / "raw")
+    (tmp_path / "images").mkdir()
+    path = str(tmp_path / "images.manifest.json")
+    destination = str(tmp_path / "images")
+    src_conn = connection.ConnectionFS(str(tmp_path / "raw"), [])
+
+    first_manifest = manifest.Manifest.load(path, destination)
+    first = run_pipeline(src_conn, first_manifest)
+    first_manifest.save()
+
+    spy = mocker.spy(src_conn, "get_content")
+    second_manifest = manifest.Manifest.load(path, destination)
+    second = run_pipeline(src_conn, second_manifest)
+    second_manifest.save()
+
+    assert spy.call_count == 0
+    assert [x.filename for x in first] == [x.filename for x in second]
+    assert [x.content for x in first] == [x.content for x in second]
+
+    # NOTE: A modified raw file is the only one that is transformed again.
+    spy.reset_mock()
+    raw_azure = tmp_path / "raw" / "azure" / "eastus.json"
+    raw_azure.write_text(raw_azure.read_text() + "\n")
+    third_manifest = manifest.Manifest.load(path, destination)
+    run_pipeline(src_conn, third_manifest)
+
+    assert spy.call_count == 1
+    assert spy.call_args.args[0].filename == str(raw_azure)
+
+
+def test_manifest_page_changed(tmp_path):
+    """Verify that only changed pages have to be written."""
+    path = str(tmp_path / "images.manifest.json")
+    destination = str(tmp_path)
+    dst_conn = connection.ConnectionFS(destination, [])
+    page_a = str(tmp_path / "a")
+    page_b = str(tmp_path / "b")
+
+    first_manifest = manifest.Manifest(path, destination)
+    for page in [page_a, page_b]:
+        entry = connection.DataEntry(page, {"date": "1"})
+        assert first_manifest.page_changed(entry)
+        dst_conn.put_content(entry)
+    first_manifest.save()
+
+    second_manifest = manifest.Manifest.load(path, destination)
+    assert not second_manifest.page_changed(connection.DataEntry(page_a, {"date": "1"}))
+    assert second_manifest.page_changed(connection.DataEntry(page_b, {"date": "2"}))
+
+
+def test_manifest_page_missing(tmp_path):
+    """Verify that unchanged pages are written again if the file is gone."""
+    path = str(tmp_path / "images.manifest.json")
+    destination = str(tmp_path)
+    dst_conn = connection.ConnectionFS(destination, [])
+    page_a = tmp_path / "a"
+    page_b = tmp_path / "b"
+
+    first_manifest = manifest.Manifest(path, destination)
+    for page in [page_a, page_b]:
+        entry = connection.DataEntry(str(page), {"date": "1"})
+        assert first_manifest.page_changed(entry)
+        dst_conn.put_content(entry)
+    first_manifest.save()
+
+    page_a.unlink()
+    page_b.write_text("{}")
+    second_manifest = manifest.Manifest.load(path, destination)
+    assert second_manifest.page_changed(
+        connection.DataEntry(str(page_a), {"date": "1"})
+    )
+    assert second_manifest.page_changed(
+        connection.DataEntry(str(page_b), {"date": "1"})
+    )
+
+
+def test_manifest_outdated_destination(tmp_path):
+    """Verify that a manifest of another destination is ignored."""
+    path = str(tmp_path / "images.manifest.json")
+
+    first_manifest = manifest.Manifest(path, str(tmp_path))
+    first_manifest.page_changed(connection.DataEntry("a", {"date": "1"}))
+    first_manifest.save()
+
+    (tmp_path / "v2").mkdir()
+    second_manifest = manifest.Manifest.load(path, str(tmp_path / "v2"))
+    assert second_manifest.pages == {}
+
+
+def test_manifest_outdated_sources(tmp_path, monkeypatch):
+    """Verify that a manifest of other transformer sources is ignored."""
+    path = str(tmp_path / "images.manifest.json")
+
+    first_manifest = manifest.Manifest(path, str(tmp_path))
+    first_manifest.page_changed(connection.DataEntry("a", {"date": "1"}))
+    first_manifest.save()
+    assert manifest.Manifest.load(path, str(tmp_path)).pages != {}
+
+    monkeypatch.setattr(manifest, "fingerprint", lambda: "changed formatter")
+    assert manifest.Manifest.load(path, str(tmp_path)).pages == {}
+
+
+def test_manifest_outdated_config(tmp_path, monkeypatch):
+    """Verify that a manifest of another configuration is ignored."""
+    path = str(tmp_path / "images.manifest.json")
+
+    first_manifest = manifest.Manifest(path, str(tmp_path))
+    first_manifest.page_changed(connection.DataEntry("a", {"date": "1"}))
+    first_manifest.save()
+    assert manifest.Manifest.load(path, str(tmp_path)).pages != {}
+
+    changed = tmp_path / "config.py"
+    changed.write_text('AWS_RHEL_OWNER_ID = "000000000000"\n')
+    monkeypatch.setattr(manifest.config, "__file__", str(changed))
+    manifest.fingerprint.cache_clear()
+    try:
+        assert manifest.Manifest.load(path, str(tmp_path)).pages == {}
+    finally:
+        monkeypatch.undo()
+        manifest.fingerprint.cache_clear()
+
+
+def test_manifest_destination_trailing_slash(tmp_path):
+    """Verify that a trailing slash of the destination keeps the manifest."""
+    destination = tmp_path / "data"
+    args = [
+        "-f",
+        "tests/transformer/testdata/input/raw/aws/af-south-1.json",
+        "-op",
+        ".",
+        "-v",
+        "v1",
+        "--filter.until",
+        "none",
+        "--incremental",
+    ]
+    runner = CliRunner()
+    result = runner.invoke(transformer.run, args + ["-dp", f"{destination}/"])
+    assert result.exit_code == 0, result.output
+    assert "unchanged pages: 0" in result.output
+    assert (destination / "v1/aws/af-south-1/rhel_6.10_hvm_x86_64_hourly2").exists()
+
+    result = runner.invoke(transformer.run, args + ["-dp", str(destination)])
+    assert result.exit_code == 0, result.output
+    assert "written pages: 0" in result.output
@@ -1,4 +1,5 @@
 from cloudimagedirectory.connection import connection
+from cloudimagedirectory.filter import filter
 from cloudimagedirectory.transform import transform
 
 
@@ -105,3 +106,140 @@ def test_transformeridxlistimagelatest():
 
     # verify that only two pages exist
     assert 3 == len(results)
+
+
+def test_transformer_concurrent_load():
+    """Verify that loading raw files concurrently keeps the output order."""
+    src_conn = connection.ConnectionFS("tests/transformer/testdata/input/raw", [])
+    data = sorted(src_conn.get_filenames(), key=lambda x: x.filename)
+
+    for transformer in [
+        transform.TransformerAWS,
+        transform.TransformerAZURE,
+        transform.TransformerGoogle,
+    ]:
+        serial = transformer(src_conn).run(data)
+        concurrent = transformer(src_conn, workers=4).run(data)
+
+        assert len(serial) > 0
+        assert [x.filename for x in serial] == [x.filename for x in concurrent]
+        assert [x.content for x in serial] == [x.content for x in concurrent]
+
+
+def test_transformer_evicts_raw_entries():
+    """Verify that the listed raw entries are loaded and evicted again."""
+    src_conn = connection.ConnectionFS("tests/transformer/testdata/input/raw", [])
+    data = src_conn.get_filenames()
+    transformer = transform.TransformerAWS(src_conn, workers=2)
+    transformed = []
+    transform_raw = transformer.transform
+
+    def spy(raw):
+        transformed.append((raw, raw.is_loaded()))
+        return transform_raw(raw)
+
+    transformer.transform = spy
+    assert len(transformer.run(data)) > 0
+
+    aws = [x for x in data if x.provider == "aws"]
+    assert [x for x, _ in transformed] == aws
+    assert all(loaded for _, loaded in transformed)
+    assert not any(x.is_loaded() for x in data)
+
+
+def test_pipeline_process_executor():
+    """Verify that sharding the raw files on a process pool keeps the output."""
+    src_conn = connection.ConnectionFS("tests/transformer/testdata/input/raw", [])
+    transformers = [
+        transform.TransformerAWS,
+        transform.TransformerAZURE,
+        transform.TransformerGoogle,
+    ]
+    idx_generators = [transform.TransformerIdxListImageLatest]
+
+    serial = transform.Pipeline(src_conn, transformers, [], idx_generators).run(
+        sorted(src_conn.get_filenames(), key=lambda x: x.filename)
+    )
+    sharded = transform.Pipeline(
+        src_conn, transformers, [], idx_generators, workers=2, executor="process"
+    ).run(sorted(src_conn.get_filenames(), key=lambda x: x.filename))
+
+    assert [x.filename for x in serial] == [x.filename for x in sharded]
+    assert [x.content for x in serial] == [x.content for x in sharded]
+
+
+def test_pipeline_buckets():
+    """Verify that every stage only gets the entries of its kind and provider."""
+    entries = [
+        connection.DataEntry("raw/aws/region-1.json", None),
+        connection.DataEntry("aws/region-1/rhel-1", {}),
+        connection.DataEntry("azure/region-1/rhel-1", {}),
+        connection.DataEntry("aws/region-2/rhel-1", {}),
+        connection.DataEntry("idx/list/image-names", []),
+    ]
+    buckets = transform.bucket(entries)
+
+    aws = transform.TransformerAWS(connection.Connection())
+    assert transform.select(buckets, aws) == entries[:1]
+    latest = transform.TransformerIdxListImageLatest(connection.Connection())
+    assert transform.select(buckets, latest) == entries[1:4]
+    latest_aws = transform.TransformerIdxListImageLatestAWS(connection.Connection())
+    assert transform.select(buckets, latest_aws) == [entries[1], entries[3]]
+
+
+def test_transformer_idx_list_all():
+    """Verify that all indexes are generated like the single generators."""
+    src_conn = connection.ConnectionFS("tests/transformer/testdata/input/raw", [])
+    data = sorted(src_conn.get_filenames(), key=lambda x: x.filename)
+    images = []
+    for transformer in [
+        transform.TransformerAWS,
+        transform.TransformerAZURE,
+        transform.TransformerGoogle,
+    ]:
+        images.extend(transformer(src_conn).run(data))
+
+    expected = []
+    for generator in [
+        transform.TransformerIdxListImageNames,
+        transform.TransformerIdxListImageLatest,
+        transform.TransformerIdxListImageLatestGoogle,
+        transform.TransformerIdxListImageLatestAWS,
+        transform.TransformerIdxListImageLatestAZURE,
+    ]:
+        expected.extend(generator(src_conn).run(images))
+    results = transform.TransformerIdxListAll(src_conn).run(images)
+
+    assert [x.filename for x in results] == [x.filename for x in expected]
+    assert [x.content for x in results] == [x.content for x in expected]
+
+
+def test_pipeline_filter(capsys):
+    """Verify that all filters are applied in one pass and report drops."""
+    entries = [
+        connection.DataEntry("aws/region-1/rhel-Test", {"date": "2023-01-01"}),
+        connection.DataEntry("aws/region-1/rhel-beta", {"date": "2023-01-01"}),
+        connection.DataEntry("aws/region-1/rhel-old", {"date": "2020-01-01"}),
+        connection.DataEntry("aws/region-1/rhel-new", {"date": "2023-01-01"}),
+        connection.DataEntry("aws/region-1/rhel-tail", {"date": "2023-01-01"}),
+    ]
+    pipeline = transform.Pipeline(
+        connection.Connection(),
+        [],
+        [
+            filter.FilterImageByFilename("test"),
+            filter.FilterImageByFilename("BETA"),
+            filter.FilterImageByLatestUpdate("2022-01-01"),
+            lambda data: [x for x in data if not x.filename.endswith("tail")],
+        ],
+        [],
+    )
+
+    results = pipeline.filter(entries)
+
+    assert [x.filename for x in results] == ["aws/region-1/rhel-new"]
+    output = capsys.readouterr().out
+    assert "filtered 1 items by filename test" in output
+    assert "filtered 1 items by filename beta" in output
+    assert "filtered 1 items by latest date 2022-01-01" in output
+    assert "filtered 1 items\n" in output
@@ -1,19 +1,32 @@
 """Test image updates from remote cloud APIs."""
 from __future__ import annotations
 
+import fnmatch
 import json
 
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch
 
+import boto3
 import pytest
 
+from botocore.stub import Stubber
 from jsonschema import ValidationError
 
 from cloudimagedirectory import config
+from cloudimagedirectory.format import format_aws
 from cloudimagedirectory.update_images import aws
 from cloudimagedirectory.update_images import schema
 
 
+@pytest.fixture(autouse=True)
+def aws_clients():
+    """Start every test without cached clients."""
+    aws.clear_clients()
+    yield
+    aws.clear_clients()
+
+
 def test_get_regions() -> None:
     """Test AWS region request."""
     with patch("botocore.client.BaseClient._make_api_call") as boto:
@@ -33,12 +46,84 @@ def test_get_regions() -> None:
 def test_describe_images() -> None:
     """Test AWS image request."""
     with patch("botocore.client.BaseClient._make_api_call") as boto:
-        aws.describe_images("us-east-1")
+        boto.return_value = {"Images": []}
+        list(aws.describe_images("us-east-1"))
 
     boto.assert_called_with(
         "DescribeImages",
-        {"IncludeDeprecated": False, "Owners": [config.AWS_RHEL_OWNER_ID]},
+        {
+            "IncludeDeprecated": False,
+            "Owners": [config.AWS_RHEL_OWNER_ID],
+            "Filters": config.AWS_IMAGE_FILTERS,
+            "MaxResults": config.AWS_PAGE_SIZE,
+        },
+    )
+
+
+def test_describe_images_pages() -> None:
+    """Ensure the images of all pages are yielded."""
+    client = boto3.client(
+        "ec2",
+        region_name="us-east-1",
+        aws_access_key_id="testing",
+        aws_secret_access_key="testing",
     )
+    params = {
+        "Owners": [config.AWS_RHEL_OWNER_ID],
+        "IncludeDeprecated": False,
+        "Filters": config.AWS_IMAGE_FILTERS,
+        "MaxResults": config.AWS_PAGE_SIZE,
+    }
+    with Stubber(client) as stubber:
+        stubber.add_response(
+            "describe_images",
+            {"Images": [{"ImageId": "ami-1"}], "NextToken": "page-2"},
+            params,
+        )
+        stubber.add_response(
+            "describe_images",
+            {"Images": [{"ImageId": "ami-2"}]},
+            dict(params, NextToken="page-2"),
+        )
+        with patch.object(aws.boto3, "client", return_value=client):
+            images = aws.describe_images("us-east-1")
+            assert [x["ImageId"] for x in images] == ["ami-1", "ami-2"]
+
+        stubber.assert_no_pending_responses()
+
+
+@pytest.mark.parametrize(
+    "image_name",
+    [
+        "RHEL-9.0.0_HVM-20220513-x86_64-0-Hourly2-GP2",
+        "rhel-9.0.0_HVM-20220513-x86_64-0-Hourly2-GP2",
+        "Rhel-9.0.0_HVM-20220513-x86_64-0-Hourly2-GP2",
+    ],
+)
+def test_image_filters_match_parsed_names(image_name) -> None:
+    """Ensure the server side filters keep every image name that is parsed."""
+    assert aws.parse_image_name(image_name)
+    (name_filter,) = config.AWS_IMAGE_FILTERS
+    assert any(fnmatch.fnmatchcase(image_name, x) for x in name_filter["Values"])
+
+
+def test_get_client() -> None:
+    """Ensure one client is created per region and shared by all threads."""
+    regions = ["us-east-1", "us-west-2"] * 8
+    with patch.object(
+        aws.boto3, "client", side_effect=lambda *_, **__: object()
+    ) as client_mock:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(executor.map(aws.get_client, regions))
+
+        assert client_mock.call_count == 2
+        client_mock.assert_any_call(
+            "ec2", region_name="us-west-2", config=aws.CLIENT_CONFIG
+        )
+
+    assert {id(x) for x in clients[::2]} == {id(aws.get_client("us-east-1"))}
+    assert {id(x) for x in clients[1::2]} == {id(aws.get_client("us-west-2"))}
+    assert clients[0] is not clients[1]
 
 
 def test_parse_name_of_all_images() -> None:
@@ -93,6 +178,63 @@ def test_get_all_images(mock_aws_regions, mock_aws_images) -> None:
         assert billing_codes == {config.AWS_HOURLY_BILLING_CODE}
 
 
+def test_collect_images() -> None:
+    """Ensure every region is described once for all image types."""
+    regions = ["eu-west-1", "us-east-1", "us-west-2"]
+    stubbers = {}
+    for region in regions:
+        client = boto3.client(
+            "ec2",
+            region_name=region,
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        stubber = Stubber(client)
+        stubber.add_response(
+            "describe_images",
+            {
+                "Images": [
+                    {
+                        "ImageId": f"ami-{region}-hourly",
+                        "UsageOperation": config.AWS_HOURLY_BILLING_CODE,
+                    },
+                    {
+                        "ImageId": f"ami-{region}-cloudaccess",
+                        "UsageOperation": config.AWS_CLOUD_ACCESS_BILLING_CODE,
+                    },
+                ]
+            },
+            {
+                "Owners": [config.AWS_RHEL_OWNER_ID],
+                "IncludeDeprecated": False,
+                "Filters": config.AWS_IMAGE_FILTERS,
+                "MaxResults": config.AWS_PAGE_SIZE,
+            },
+        )
+        stubber.activate()
+        stubbers[region] = (client, stubber)
+
+    with patch.object(
+        aws.boto3,
+        "client",
+        side_effect=lambda _, region_name, config: stubbers[region_name][0],
+    ):
+        images = aws.collect_images(["hourly", "cloudaccess"], regions=regions)
+
+    for _client, stubber in stubbers.values():
+        stubber.assert_no_pending_responses()
+
+    assert list(images["hourly"].keys()) == regions
+    assert list(images["cloudaccess"].keys()) == regions
+    for region in regions:
+        assert [x["ImageId"] for x in images["hourly"][region]] == [
+            f"ami-{region}-hourly"
+        ]
+        assert [x["ImageId"] for x in images["cloudaccess"][region]] == [
+            f"ami-{region}-cloudaccess"
+        ]
+
+
 def test_parse_image_name_basic():
     """Test parsing an AWS image name with a very basic image."""
     image_name = "RHEL-7.9_HVM-20220512-x86_64-1-Hourly2-GP2"
@@ -203,3 +345,37 @@ def test_format_all_images(mock_aws_regions, mock_aws_images):
         schema.validate_json(data)
     except ValidationError as exc:
         raise AssertionError(f"Formatted data does not expect schema: {exc}")
+
+
+def test_parse_image_name_cached():
+    """Ensure parsed image names are memoized but returned as copies."""
+    image_name = "RHEL-8.6.0_HVM-20220503-arm64-2-Hourly2-GP2"
+    format_aws.match_image_name_rhel.cache_clear()
+
+    first = aws.parse_image_name(image_name)
+    first["version"] = "changed"
+    second = aws.parse_image_name(image_name)
+
+    assert second["version"] == "8.6.0"
+    assert format_aws.match_image_name_rhel.cache_info().hits == 1
+
+
+def test_format_image_shared_template():
+    """Ensure an image published in several regions is parsed once."""
+    image = {
+        "Name": "RHEL-8.6.0_HVM-20220503-arm64-2-Hourly2-GP2",
+        "Architecture": "arm64",
+        "ImageId": "ami-1",
+        "VirtualizationType": "hvm",
+        "CreationDate": "2022-05-03T10:00:00.000Z",
+    }
+    format_aws.image_template_rhel.cache_clear()
+
+    east = aws.format_image(image, "us-east-1")
+    west = aws.format_image(dict(image, ImageId="ami-2"), "us-west-2")
+
+    assert format_aws.image_template_rhel.cache_info().misses == 1
+    assert east["name"] == west["name"] == "RHEL 8.6.0 hvm arm64 Hourly2"
+    assert west["imageId"] == "ami-2"
+    assert west["region"] == "us-west-2"
+    assert west["selflink"].endswith("region=us-west-2#launchAmi=ami-2")
@@ -2,7 +2,12 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
+import time
 
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
@@ -16,7 +21,15 @@ from cloudimagedirectory.update_images import azure
 from cloudimagedirectory.update_images import schema
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.post")
+@pytest.fixture(autouse=True)
+def token_provider(monkeypatch):
+    """Start every test without a cached access token."""
+    provider = azure.TokenProvider(margin=config.AZURE_TOKEN_REFRESH_MARGIN)
+    monkeypatch.setattr(azure, "token_provider", provider)
+    return provider
+
+
+@patch("cloudimagedirectory.update_images.azure.session.post")
 def test_get_access_token(mock_post: MagicMock) -> None:
     """Test retrieving Azure locations."""
     mock_response = MagicMock()
@@ -29,7 +42,7 @@ def test_get_access_token(mock_post: MagicMock) -> None:
     assert access_token == "secret"  # nosec B105
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.post")
+@patch("cloudimagedirectory.update_images.azure.session.post")
 def test_fail_to_get_access_token(mock_post: MagicMock) -> None:
     """Test retrieving Azure locations."""
     mock_response = MagicMock()
@@ -41,8 +54,96 @@ def test_fail_to_get_access_token(mock_post: MagicMock) -> None:
         azure.get_access_token()
 
 
+@patch("cloudimagedirectory.update_images.azure.session.post")
+def test_cache_access_token(mock_post: MagicMock) -> None:
+    """Test reusing the access token until shortly before it expires."""
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.side_effect = [
+        {"access_token": "first", "expires_on": str(int(time.time()) + 3600)},
+        {"access_token": "second", "expires_in": "60"},
+        {"access_token": "third", "expires_in": "3600"},
+    ]
+    mock_post.return_value = mock_response
+
+    assert azure.get_access_token() == "first"  # nosec B105
+    assert azure.get_access_token() == "first"  # nosec B105
+    assert mock_post.call_count == 1
+
+    # The token expires within the refresh margin, so it is refreshed.
+    azure.token_provider.expires_on = time.time() + 60
+    assert azure.get_access_token() == "second"  # nosec B105
+    assert azure.get_access_token() == "third"  # nosec B105
+    assert mock_post.call_count == 3
+
+
+@patch("cloudimagedirectory.update_images.azure.session.post")
+def test_cache_access_token_in_file(mock_post: MagicMock, tmp_path) -> None:
+    """Test sharing the access token between runs through a file."""
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"access_token": "secret", "expires_in": 3600}
+    mock_post.return_value = mock_response
+    cache_path = str(tmp_path / "token.json")
+
+    first = azure.TokenProvider(cache_path, config.AZURE_TOKEN_REFRESH_MARGIN)
+    assert first.get() == "secret"  # nosec B105
+    assert os.stat(cache_path).st_mode & 0o777 == 0o600
+
+    second = azure.TokenProvider(cache_path, config.AZURE_TOKEN_REFRESH_MARGIN)
+    assert second.get() == "secret"  # nosec B105
+    assert mock_post.call_count == 1
+
+    # A token of another account is not used.
+    with patch.object(config, "AZURE_CLIENT_ID", "another-client"):
+        third = azure.TokenProvider(cache_path, config.AZURE_TOKEN_REFRESH_MARGIN)
+        assert third.get() == "secret"  # nosec B105
+    assert mock_post.call_count == 2
+
+
+@patch("cloudimagedirectory.update_images.azure.session.post")
+@patch("cloudimagedirectory.update_images.azure.session.get")
+def test_reauthenticate_rejected_token(
+    mock_get: MagicMock, mock_post: MagicMock, tmp_path, monkeypatch
+) -> None:
+    """Test replacing a stale cached token that Azure rejects."""
+    cache_path = tmp_path / "token.json"
+    provider = azure.TokenProvider(str(cache_path), config.AZURE_TOKEN_REFRESH_MARGIN)
+    provider.token = "stale"  # nosec B105
+    provider.expires_on = time.time() + 3600
+    provider.save()
+    monkeypatch.setattr(azure, "token_provider", provider)
+
+    login = MagicMock()
+    login.status_code = 200
+    login.json.return_value = {"access_token": "fresh", "expires_in": 3600}
+    mock_post.return_value = login
+
+    sent = []
+
+    def get(url, params, headers, timeout):
+        sent.append(headers["Authorization"])
+        return mock_response(401 if headers["Authorization"] == "Bearer stale" else 200)
+
+    mock_get.side_effect = get
+
+    token = azure.get_access_token()
+    assert azure.get_offers(token, "eastus", "publisher") == ["offer"]
+    assert sent == ["Bearer stale", "Bearer fresh"]
+    assert json.loads(cache_path.read_text())["access_token"] == "fresh"
+
+    # Every call authenticates once more at most.
+    sent.clear()
+    mock_get.side_effect = None
+    mock_get.return_value = mock_response(401)
+    with pytest.raises(Exception, match=r"Unable to retrieve skus."):
+        azure.get_skus("fresh", "eastus", "publisher", "offer")
+    assert mock_get.call_count == 4
+    assert mock_post.call_count == 2
+
+
 @patch(
-    "cloudimagedirectory.update_images.azure.requests.post",
+    "cloudimagedirectory.update_images.azure.session.post",
     side_effect=RequestException("Failed Request"),
 )
 def test_post_request_ambigious_request_error(mock_post: MagicMock) -> None:
@@ -52,7 +153,7 @@ def test_post_request_ambigious_request_error(mock_post: MagicMock) -> None:
 
 
 @patch(
-    "cloudimagedirectory.update_images.azure.requests.get",
+    "cloudimagedirectory.update_images.azure.session.get",
     side_effect=RequestException("Failed Request"),
 )
 def test_get_request_ambigious_request_error(mock_get: MagicMock) -> None:
@@ -61,7 +162,7 @@ def test_get_request_ambigious_request_error(mock_get: MagicMock) -> None:
         azure.get_request("https://foo.bar", {"foo": "bar"}, {"foo": "bar"})
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_get_locations(mock_requests: MagicMock) -> None:
     """Test getting Azure location list."""
     mock_response = MagicMock()
@@ -102,7 +203,7 @@ def test_get_locations(mock_requests: MagicMock) -> None:
     assert regions == ["eastus"]
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_fail_get_locations(mock_requests: MagicMock) -> None:
     """Test failing to get Azure location list."""
     mock_response = MagicMock()
@@ -113,7 +214,7 @@ def test_fail_get_locations(mock_requests: MagicMock) -> None:
         azure.get_locations("dummy_access_token")
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_get_publishers(mock_get: MagicMock):
     """Test retrieving and filtering Azure publishers."""
     mock_response = MagicMock()
@@ -133,7 +234,7 @@ def test_get_publishers(mock_get: MagicMock):
     assert publishers == [mock_response.json.return_value[0]["name"]]
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_fail_get_publishers(mock_requests: MagicMock) -> None:
     """Test failing to get Azure publisher list."""
     mock_response = MagicMock()
@@ -144,7 +245,7 @@ def test_fail_get_publishers(mock_requests: MagicMock) -> None:
         azure.get_publishers("dummy_access_token", "dummy_location")
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_get_offers(mock_get: MagicMock):
     """Test retrieving and filtering Azure offers."""
     mock_response = MagicMock()
@@ -164,7 +265,7 @@ def test_get_offers(mock_get: MagicMock):
     assert offers == [mock_response.json.return_value[0]["name"]]
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_fail_get_offers(mock_requests: MagicMock) -> None:
     """Test failing to get Azure offer list."""
     mock_response = MagicMock()
@@ -175,7 +276,7 @@ def test_fail_get_offers(mock_requests: MagicMock) -> None:
         azure.get_offers("dummy_access_token", "dummy_location", "dummy_publisher")
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_get_skus(mock_get: MagicMock):
     """Test retrieving and filtering Azure SKUs."""
     mock_response = MagicMock()
@@ -195,7 +296,7 @@ def test_get_skus(mock_get: MagicMock):
     assert skus == [mock_response.json.return_value[0]["name"]]
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_fail_get_skus(mock_requests: MagicMock) -> None:
     """Test failing to get Azure sku list."""
     mock_response = MagicMock()
@@ -208,7 +309,7 @@ def test_fail_get_skus(mock_requests: MagicMock) -> None:
         )
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_get_image_versions(mock_get: MagicMock):
     """Test retrieving and filtering Azure image versions."""
     mock_response = MagicMock()
@@ -255,7 +356,7 @@ def test_get_image_versions(mock_get: MagicMock):
     assert image_versions == [x["name"] for x in mock_response.json.return_value]
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_fail_get_image_versions(mock_requests: MagicMock) -> None:
     """Test failing to get image versions."""
     mock_response = MagicMock()
@@ -272,7 +373,7 @@ def test_fail_get_image_versions(mock_requests: MagicMock) -> None:
         )
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_get_image_details(mock_get: MagicMock):
     """Test retrieving Azure image details."""
     mock_response = MagicMock()
@@ -310,7 +411,7 @@ def test_get_image_details(mock_get: MagicMock):
     )
 
 
-@patch("cloudimagedirectory.update_images.azure.requests.get")
+@patch("cloudimagedirectory.update_images.azure.session.get")
 def test_fail_get_image_details(mock_requests: MagicMock) -> None:
     """Test failing to get image details."""
     mock_response = MagicMock()
@@ -328,6 +429,117 @@ def test_fail_get_image_details(mock_requests: MagicMock) -> None:
         )
 
 
+def mock_response(status_code: int, headers: dict[str, str] | None = None):
+    """Create a response with a status code and headers."""
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.json.return_value = [{"name": "offer"}]
+    return response
+
+
+@pytest.fixture
+def retry_policy(monkeypatch):
+    """Provide a fresh retry policy and skip the waiting."""
+    policy = azure.RetryPolicy(backoff=1, max_backoff=30, budget=3)
+    monkeypatch.setattr(azure, "retry_policy", policy)
+    with patch("cloudimagedirectory.update_images.azure.time.sleep") as mock_sleep:
+        yield mock_sleep
+
+
+@patch("cloudimagedirectory.update_images.azure.session.get")
+def test_retry_throttled_request(mock_get: MagicMock, retry_policy) -> None:
+    """Test waiting as long as the Retry-After header asks for."""
+    mock_get.side_effect = [
+        mock_response(429, {"Retry-After": "7"}),
+        mock_response(503),
+        mock_response(200),
+    ]
+
+    offers = azure.get_offers("dummy_access_token", "eastus", "publisher")
+
+    assert offers == ["offer"]
+    assert mock_get.call_count == 3
+    assert retry_policy.call_args_list[0].args == (7.0,)
+    assert 0 <= retry_policy.call_args_list[1].args[0] <= 2
+
+
+@patch("cloudimagedirectory.update_images.azure.session.get")
+def test_no_retry_on_client_error(mock_get: MagicMock, retry_policy) -> None:
+    """Test failing at once on errors that a retry can't fix."""
+    mock_get.return_value = mock_response(403)
+
+    with pytest.raises(Exception, match=r"Unable to retrieve offers."):
+        azure.get_offers("dummy_access_token", "eastus", "publisher")
+
+    assert mock_get.call_count == 1
+    retry_policy.assert_not_called()
+
+
+@patch("cloudimagedirectory.update_images.azure.session.get")
+def test_retry_budget(mock_get: MagicMock, retry_policy) -> None:
+    """Test giving up once the retries of a run are spent."""
+    mock_get.return_value = mock_response(500)
+
+    with pytest.raises(Exception, match=r"Unable to retrieve offers."):
+        azure.get_offers("dummy_access_token", "eastus", "publisher")
+    with pytest.raises(Exception, match=r"Unable to retrieve skus."):
+        azure.get_skus("dummy_access_token", "eastus", "publisher", "offer")
+
+    # Three retries of the budget and one attempt of each call.
+    assert mock_get.call_count == 5
+    assert retry_policy.call_count == 3
+
+
+def test_retry_delay() -> None:
+    """Test the backoff and the parsing of Retry-After headers."""
+    policy = azure.RetryPolicy(backoff=1, max_backoff=30, budget=3)
+
+    for attempt in range(8):
+        delay = policy.delay(attempt, mock_response(500))
+        assert 0 <= delay <= min(30, 2**attempt)
+
+    assert policy.delay(0, mock_response(429, {"Retry-After": "120"})) == 30
+    assert policy.delay(0, mock_response(429, {"Retry-After": "soon"})) <= 1
+    assert azure.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert azure.parse_retry_after(None) is None
+
+
+@patch("cloudimagedirectory.update_images.azure.session.get")
+def test_revalidate_cached_listing(mock_get: MagicMock, tmp_path, monkeypatch):
+    """Test revalidating a cached listing with a conditional request."""
+    monkeypatch.setattr(azure, "response_cache", azure.ResponseCache(str(tmp_path)))
+    changed = mock_response(200, {"ETag": '"1"', "Last-Modified": "yesterday"})
+    mock_get.side_effect = [changed, mock_response(304)]
+
+    assert azure.get_offers("dummy_access_token", "eastus", "publisher") == ["offer"]
+    assert azure.get_offers("dummy_access_token", "eastus", "publisher") == ["offer"]
+
+    assert "If-None-Match" not in mock_get.call_args_list[0].kwargs["headers"]
+    headers = mock_get.call_args_list[1].kwargs["headers"]
+    assert headers["If-None-Match"] == '"1"'
+    assert headers["If-Modified-Since"] == "yesterday"
+    assert headers["Authorization"] == "Bearer dummy_access_token"
+    assert changed.json.call_count == 1
+
+
+@patch("cloudimagedirectory.update_images.azure.session.get")
+def test_fresh_cached_listing(mock_get: MagicMock, tmp_path, monkeypatch):
+    """Test using a cached listing without a request within the ttl."""
+    monkeypatch.setattr(
+        azure, "response_cache", azure.ResponseCache(str(tmp_path), ttl=3600)
+    )
+    mock_get.return_value = mock_response(200)
+
+    assert azure.get_skus("dummy_access_token", "eastus", "pub", "off") == ["offer"]
+    assert azure.get_skus("dummy_access_token", "eastus", "pub", "off") == ["offer"]
+    assert mock_get.call_count == 1
+
+    # Other listings are not served from the cache.
+    azure.get_skus("dummy_access_token", "eastus", "pub", "another")
+    assert mock_get.call_count == 2
+
+
 def test_get_latest_images(
     mock_azure_access_token, mock_azure_image_version_list, mock_azure_image_details
 ):
@@ -387,6 +599,88 @@ def test_get_all_images(
     assert len(images) == len(mock_azure_image_version_list.return_value)
 
 
+@pytest.fixture
+def azure_server(monkeypatch):
+    """Serve image versions and image details from a local server."""
+    versions = {"sku-a": ["1.0.20230101", "1.1.20230201"], "sku-b": ["2.0.20230301"]}
+    state = {"active": 0, "max_active": 0, "paths": [], "clients": set()}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            with lock:
+                state["active"] += 1
+                state["max_active"] = max(state["max_active"], state["active"])
+                state["paths"].append(self.path)
+                state["clients"].add(self.client_address)
+            time.sleep(0.05)
+
+            parts = self.path.split("?")[0].split("/")
+            if parts[-1] == "versions":
+                body = [{"name": x} for x in versions[parts[-2]]]
+            else:
+                body = {"name": parts[-1], "properties": {"architecture": parts[-3]}}
+
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            with lock:
+                state["active"] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(
+        config, "AZURE_MANAGEMENT_URL", f"http://127.0.0.1:{server.server_port}"
+    )
+    monkeypatch.setattr(config, "AZURE_MAX_WORKERS", 4)
+    monkeypatch.setattr(
+        config,
+        "AZURE_RHEL_IMAGE_TREE",
+        [{"redhat": {"RHEL": {"sku-a": "", "sku-b": "latest"}}}],
+    )
+    yield state
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_images_concurrently(mock_azure_access_token, azure_server):
+    """Test traversing the image tree with concurrent requests."""
+    images = azure.get_images()
+
+    assert [x["urn"] for x in images] == [
+        "redhat:RHEL:sku-a:1.0.20230101",
+        "redhat:RHEL:sku-a:1.1.20230201",
+        "redhat:RHEL:sku-b:2.0.20230301",
+    ]
+    assert [x["architecture"] for x in images] == ["sku-a", "sku-a", "sku-b"]
+    assert len(azure_server["paths"]) == 5
+    assert azure_server["max_active"] > 1
+
+
+def test_get_images_reuses_connections(
+    mock_azure_access_token, azure_server, monkeypatch
+):
+    """Test keeping the connection alive across requests."""
+    monkeypatch.setattr(config, "AZURE_MAX_WORKERS", 1)
+    monkeypatch.setattr(azure, "session", azure.create_session())
+    azure.get_images()
+    azure.get_images()
+
+    assert len(azure_server["paths"]) == 10
+    assert len(azure_server["clients"]) == 1
+
+
 def test_format_image():
     """Test verifying transformed Azure images into a schema approved
     format."""